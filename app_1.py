@@ -1,321 +1,305 @@
 import streamlit as st
 import pandas as pd
+import os
 import io
-import re
+import sqlite3
 import base64
+import cProfile
+import pstats
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
 
-# --- 1. REFERENCE DATA ---
-CDO_BARANGAYS = [
-    "AGUSAN", "BAIKINGON", "BALUBAL", "BALULANG", "BAYABAS", "BAYANGA", "BESIGAN", 
-    "BONBON", "BUGO", "BUHUAWEN", "BULUA", "CAMAMAN-AN", "CANITOAN", "CARMEN", 
-    "CONSOLACION", "CUGMAN", "DANSOLIHON", "F.S. CATANICO", "GUSA", "INDAHAG", 
-    "IPONAN", "KAUSWAGAN", "LAPASAN", "LUMBAMBIA", "LUMBIA", "MACABALAN", 
-    "MACASANDIG", "MAGSAYSAY", "MAMBUAYA", "NAZARETH", "PAGALUNGAN", "PAGATPAT", 
-    "PATAG", "PIGSAG-AN", "PUERTO", "PUNTOD", "SAN SIMON", "TABLON", "TAGLIMAO", 
-    "TAGPANGI", "TIGNAPOLOAN", "TUBURAN", "TUMPAGON"
-]
-for i in range(1, 41):
-    CDO_BARANGAYS.append(f"BARANGAY {i}")
-
-SUB_BRGY_MAP = {
-    "CALAANAN": "CANITOAN", "PASIL": "KAUSWAGAN", "AGORA": "LAPASAN",
-    "MACANHAN": "CARMEN", "ORO HABITAT": "CANITOAN"
-}
+from PIL import Image
+
+from cho_pipeline import (
+    CACHE_DIR, RAW_EXPORT_FORMATS, AddressCache, BackgroundJob, Cancelled, FuzzyMatcher, LRUCache, RecordStore,
+    available_backends, build_workbook, cube_values, export_raw, file_digest, log_to_file, planned_steps, process_pool,
+    run_pipeline, summary_from_cube,
+)
 
-# --- 2. CLEANING LOGIC ---
-def process_strict_address(row):
-    addr_val = str(row.get('ADDRESS', '')).upper().strip()
-    spec_val = str(row.get('SPECIFIC ADDRESS', '')).upper().strip()
-    full_text = f"{addr_val} {spec_val}".strip()
-    if full_text in ["NAN", "NONE", ""]: return "MISSING"
-    
-    found_brgy = None
-    for sitio, parent_brgy in SUB_BRGY_MAP.items():
-        if re.search(r'\b' + re.escape(sitio) + r'\b', full_text):
-            found_brgy = parent_brgy
-            break
-    if not found_brgy:
-        for brgy in CDO_BARANGAYS:
-            if re.search(r'\b' + re.escape(brgy) + r'\b', full_text):
-                found_brgy = brgy
-                break
-    return found_brgy if found_brgy else ("TRANSIENT" if "TRANSIENT" not in full_text else "TRANSIENT")
-
-# --- 3. SUMMARY ENGINE (Calculates values from Raw Data) ---
-def generate_health_summary(df, group_by_col='ADDRESS'):
-    summary_list = []
-    if group_by_col not in df.columns: return pd.DataFrame()
-
-    # Filter out empty/missing groups
-    groups = [g for g in df[group_by_col].unique() if str(g) not in ["MISSING", "nan", "None", ""]]
-    
-    # Chronological sort for months
-    if group_by_col == 'MONTH':
-        months_order = ['JANUARY', 'FEBRUARY', 'MARCH', 'APRIL', 'MAY', 'JUNE', 
-                        'JULY', 'AUGUST', 'SEPTEMBER', 'OCTOBER', 'NOVEMBER', 'DECEMBER']
-        groups = sorted(groups, key=lambda x: months_order.index(str(x).upper()) if str(x).upper() in months_order else 99)
-    else:
-        groups = sorted(groups)
-
-    for group in groups:
-        subset = df[df[group_by_col] == group]
-        total = len(subset)
-        if total == 0: continue
-
-        # Calculations based on strings in your Raw Data
-        m = len(subset[subset['GENDER'].astype(str).str.startswith('M', na=False)])
-        f = len(subset[subset['GENDER'].astype(str).str.startswith('F', na=False)])
-        
-        gt = len(subset[subset['WGT. IN GRAMS'].astype(str).str.contains('GREATER|2500', case=False, na=False)])
-        lt = len(subset[subset['WGT. IN GRAMS'].astype(str).str.contains('LESSER|2500', case=False, na=False)])
-        
-        # Place of Delivery Logic
-        hosp = len(subset[subset['PLACE_OF_DELIVERY'].astype(str).str.contains('HOSP', case=False, na=False)])
-        hc = len(subset[subset['PLACE_OF_DELIVERY'].astype(str).str.contains('HC|HEALTH CENTER', case=False, na=False)])
-        lying = len(subset[subset['PLACE_OF_DELIVERY'].astype(str).str.contains('LYING', case=False, na=False)])
-        fac_total = hosp + hc + lying
-        
-        # Attendant Logic
-        md = len(subset[subset['ATTENDANT'].astype(str).str.contains('MD|PHYSICIAN', case=False, na=False)])
-        mw = len(subset[subset['ATTENDANT'].astype(str).str.contains('MIDWIFE|RHM|PHN', case=False, na=False)])
-        skilled = md + mw
-        
-        # Age Logic
-        ages = pd.to_numeric(subset['AGE'], errors='coerce')
-        a1 = len(subset[(ages >= 10) & (ages <= 14)])
-        a2 = len(subset[(ages >= 15) & (ages <= 19)])
-        a3 = len(subset[(ages >= 20) & (ages <= 24)])
-        a4 = len(subset[ages >= 25])
-        
-        # Provider Logic
-        gov = len(subset[subset['GOV/PRI'].astype(str).str.contains('GOV', case=False, na=False)])
-        pri = total - gov
-
-        summary_list.append([
-            group, m, f, total, gt, lt, total,
-            hosp, hc, lying, fac_total, (total - fac_total), total, (fac_total/total if total > 0 else 0),
-            md, mw, skilled, (total - skilled), total, (skilled/total if total > 0 else 0),
-            a1, a2, a3, a4, total, ((a1+a2)/total if total > 0 else 0),
-            gov, pri, total
-        ])
-
-    label = "Month" if group_by_col == 'MONTH' else "Barangay"
-    cols = [
-        label, 'Male', 'Female', 'Total Count', '>2500g', '<2500g', 'Total W',
-        'Hospital', 'Health Center', 'Lying-In', 'Total Facility', 'Home/Other', 'Total P', '% FBD',
-        'MD/Physician', 'Midwife/Nurse', 'Total Skilled', 'Non-Skilled', 'Total A', '% SBA',
-        '10-14Y', '15-19Y', '20-24Y', '25+Y', 'Total Age', '% Teenage', 'Govt', 'Private', 'Total G'
-    ]
-    return pd.DataFrame(summary_list, columns=cols)
-
-# --- 4. UI AND AUTO-MERGE ---
+# --- UI AND AUTO-MERGE ---
 st.set_page_config(page_title="CHO Records Standardizer", layout="wide")
 
-def get_base64(path):
+@st.cache_resource
+def get_caches():
+    # Shared by every session and kept across reruns: parsed files, then whole merged results. Bounded by their
+    # approximate size in memory (MB, from the environment) rather than by count, since one upload can be large
+    return (LRUCache(max_bytes=int(os.environ.get("CHO_FILE_CACHE_MB", "200")) * 2**20),
+            LRUCache(max_bytes=int(os.environ.get("CHO_RESULT_CACHE_MB", "200")) * 2**20))
+
+file_cache, result_cache = get_caches()
+
+@st.cache_resource
+def get_address_cache():
+    # Optional: without a writable cache directory addresses are simply resolved every run
+    try: return AddressCache(os.path.join(CACHE_DIR, "address_cache.sqlite"))
+    except (OSError, sqlite3.Error): return None
+
+address_cache = get_address_cache()
+
+@st.cache_resource
+def start_stage_log():
+    # Structured per-stage log (JSON lines) next to the address cache; diagnostics still work without it
+    try: log_to_file()
+    except OSError: pass
+
+start_stage_log()
+
+@st.cache_resource
+def get_job_executor():
+    # One small pool shared by every session: runs queue up and take turns instead of all competing at once
+    return ThreadPoolExecutor(max_workers=int(os.environ.get("CHO_WORKERS", "2")), thread_name_prefix="cho-run")
+
+@st.cache_resource
+def get_process_pool():
+    # Workbook parsing processes, started once (by forkserver, never forked from a job thread) and reused by every run
+    return process_pool()
+
+@st.cache_resource
+def get_record_store():
+    try: return RecordStore()
+    except OSError: return None
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(APP_DIR, "static")
+# Page images: source -> (optimized copy in ./static, box it is shrunk to; twice the displayed size for sharp HiDPI)
+PAGE_ASSETS = {
+    "CITY-HEALTH-OFFICE-DOCTORS.png": ("background.webp", (1920, 1920)),
+    "images.png": ("logo.webp", (270, 90)),
+}
+
+def optimize_asset(source, name, box):
+    # Resized WebP, rebuilt only when the source is newer; an unwritable folder keeps whatever copy is there
+    target = os.path.join(STATIC_DIR, name)
+    if not os.path.exists(target) or os.path.getmtime(target) < os.path.getmtime(source):
+        try:
+            os.makedirs(STATIC_DIR, exist_ok=True)
+            with Image.open(source) as img:
+                img.thumbnail(box)
+                img.save(target + ".tmp", "WEBP", quality=80, method=6)
+            os.replace(target + ".tmp", target)
+        except OSError:
+            if not os.path.exists(target): raise
+    return target
+
+@st.cache_resource
+def get_page_assets():
+    """{source image: URL} and the stylesheet text, prepared once per process.
+
+    Images are served by Streamlit's static file serving (.streamlit/config.toml) so browsers fetch and cache
+    them once; when it is off, the small WebP copies are inlined instead of the multi-megabyte originals.
+    """
+    urls = {}
+    for source, (name, box) in PAGE_ASSETS.items():
+        try:
+            target = optimize_asset(os.path.join(APP_DIR, source), name, box)
+        except OSError:
+            urls[source] = ""
+            continue
+        if st.get_option("server.enableStaticServing"):
+            urls[source] = f"app/static/{name}?v={int(os.path.getmtime(target))}"
+        else:
+            with open(target, "rb") as f: urls[source] = "data:image/webp;base64," + base64.b64encode(f.read()).decode()
     try:
-        with open(path, "rb") as f: return base64.b64encode(f.read()).decode()
-    except: return ""
-
-# PNG Background Logic
-bg_img = get_base64("CITY-HEALTH-OFFICE-DOCTORS.png")
-logo_img = get_base64("images.png")
-
-st.markdown(f"""
-    <style>
-    /* 1. Background image for the app - Updated for movement/zoom */
-    [data-testid="stApp"] {{
-        background-image: url("data:image/jpeg;base64,{bg_img}");
-        
-        /* 'cover' ensures the image stretches to fill the space without gaps */
-        background-size: cover;
-        
-        /* 'center' ensures the zoom originates from the middle of the image */
-        background-position: center center;
-        
-        /* 'fixed' keeps the image in place while content scrolls over it */
-        background-attachment: fixed;
-        
-        background-repeat: no-repeat;
-    }}
-
-    /* Hide default Streamlit header */
-    [data-testid="stHeader"] {{
-        visibility: hidden;
-    }}
-
-    /* 2. Main container (Centered) */
-    [data-testid="stAppViewBlockContainer"] {{
-        width: 95%; /* Ensures it doesn't hit screen edges when zoomed */
-        max-width: 850px;
-        margin-left: auto;
-        margin-right: auto;
-        padding-top: 12rem;
-        padding-bottom: 5rem;
-        
-        /* Box background */
-        background-color: rgba(255, 255, 255, 0.9); 
-        padding-left: 40px;
-        padding-right: 40px;
-        border-radius: 20px;
-        box-shadow: 0 8px 32px 0 rgba(0, 0, 0, 0.2);
-        margin-top: 50px;
-        margin-bottom: 50px;
-        
-        color: black !important;
-    }}
-
-    /* Target all headers, labels, and standard text to be BLACK */
-    h1, h2, h3, p, label, .stMarkdown, [data-testid="stMarkdownContainer"] p {{
-        color: black !important;
-    }}
-
-    /* 3. Top corner header styling */
-    .top-header {{
-        position: fixed;
-        top: 0;
-        left: 0;
-        width: 100%;
-        height: 70px;
-        background-color: white;
-        display: flex;
-        align-items: center;
-        padding: 0 40px;
-        border-bottom: 3px solid #87b97b;
-        z-index: 9999;
-        box-shadow: 0 2px 10px rgba(0,0,0,0.1);
-    }}
-
-    .logo-img {{
-        height: 45px;
-        margin-right: 20px;
-    }}
-
-    .header-label {{
-        font-weight: bold;
-        color: black !important;
-        font-family: 'Segoe UI', sans-serif;
-        font-size: 1.2rem;
-    }}
-
-    .main-title {{ 
-        font-size: 28px; 
-        font-weight: bold; 
-        color: black !important; 
-        text-align: center; 
-        margin-bottom: 30px; 
-    }}
-    
-    .stFileUploader {{
-        text-align: center;
-        color: black !important;
-    }}
-
-    [data-testid="stFileUploadDropzone"] div {{
-        color: black !important;
-    }}
-
-    /* Table styling */
-    th {{
-        background-color: #1E3A8A !important;
-        color: white !important; 
-        font-weight: bold !important;
-        text-align: center !important;
-    }}
-    
-    td {{
-        color: black !important;
-    }}
-    
-    /* Button styling */
-    .stButton>button {{ 
-        background-color: #1E3A8A; 
-        color: white !important; 
-        border-radius: 10px; 
-        font-weight: bold; 
-    }}
-    
-    /* Optional: Add a hover effect so it reacts when touched */
-    .stButton>button:hover {{
-        background-color: #1E3A8A;
-        color: white !important;
-        border-radius: 10px; 
-        font-weight: bold;
-    }}
-    
-    </style>
-
-    <div class="top-header">
-        <img src="data:image/png;base64,{logo_img}" class="logo-img">
-        <div class="header-label">City Health Office | Records Standardizer</div>
-    </div>
+        with open(os.path.join(APP_DIR, "style.css")) as f: css = f.read()
+    except OSError:
+        css = ""
+    return urls, css
+
+asset_urls, page_css = get_page_assets()
+
+# Only URLs and the stylesheet text go to the browser on each rerun, never the image bytes
+st.markdown(f"""<style>
+:root {{ --cho-background: url("{asset_urls['CITY-HEALTH-OFFICE-DOCTORS.png']}"); }}
+{page_css}</style>
+
+<div class="top-header">
+    <img src="{asset_urls['images.png']}" class="logo-img">
+    <div class="header-label">City Health Office | Records Standardizer</div>
+</div>
 """, unsafe_allow_html=True)
 
 st.write("Upload your **Raw Data** files. The app will automatically merge and calculate summaries!")
 files = st.file_uploader("Upload Excel/CSV Files:", accept_multiple_files=True)
 
+all_sheets = st.checkbox("Read every sheet of each workbook (e.g. one sheet per month)")
+measure_memory = st.checkbox("Track memory per stage (slower)")
+fuzzy_on = st.checkbox("Fuzzy-match misspelled barangays (e.g. KAUSWAGN, CAMAMAN AN)")
+fuzzy_threshold = st.slider("Fuzzy match similarity threshold", 0.70, 0.99, 0.85, 0.01) if fuzzy_on else None
+dedupe = st.checkbox("Merge births reported by more than one station (same mother, child, date, barangay and sex)", value=True)
+backend = st.selectbox("Processing engine (same results; DuckDB/Polars use every core):", available_backends())
+append_mode = st.checkbox("Append mode: keep processed records and only process files not uploaded before")
+record_store = get_record_store() if append_mode else None
+if append_mode and record_store is None:
+    st.warning("Append mode needs a writable store directory (set CHO_STORE_DIR); processing this upload on its own.")
+    append_mode = False
+if record_store is not None:
+    if record_store.invalidated:
+        st.warning("The barangay reference lists changed since records were stored, so the store was cleared. Please re-upload.")
+    if dedupe:
+        st.info("Append mode merges exact repeats of stored births, but not misspelled ones reported in another upload, "
+                "so its totals can be higher than processing all files together.")
+    stored = record_store.files()
+    st.caption(f"Store holds {len(stored)} file(s), {int(stored['Rows'].sum()) if len(stored) else 0} records.")
+    if st.button("Clear stored records"):
+        record_store.clear()
+        st.session_state.pop('cho_job', None)
+profile_run = st.checkbox("Profile this run with cProfile (re-processes the upload)")
+
+@st.fragment(run_every=0.5)
+def show_progress(job):
+    # Re-runs on its own every half second; only this panel refreshes while the worker runs
+    fraction, running = job.progress()
+    st.progress(fraction, text=f"Processing... {running}")
+    if job.done: st.rerun()
+    if st.button("Cancel processing", disabled=job.cancelled): job.cancel()
+
+def process(report, uploads, digests, all_sheets, fuzzy, backend, dedupe, append_mode, profile_run, result_key):
+    """One pipeline run on the job executor; returns (result, appended file names, served from the result cache)."""
+    profiler = cProfile.Profile() if profile_run else None
+    if profiler is not None: profiler.enable()
+    # openpyxl parsing holds the GIL, so workbooks are read in worker processes; CSV-only uploads stay on threads
+    workbooks = any(not name.lower().endswith('.csv') for name, _ in uploads)
+    try:
+        result = run_pipeline(uploads, report, digests, all_sheets=all_sheets, fuzzy=fuzzy, backend=backend, dedupe=dedupe,
+                              processes=get_process_pool() if workbooks else False, address_cache=address_cache, file_cache=file_cache,
+                              store=record_store if append_mode else None, result_cache=None if profile_run else result_cache)
+        if result['cached']: return result, result['added'], True
+    except BrokenProcessPool:
+        # A worker died (e.g. out of memory): the next run starts a fresh pool instead of failing the same way
+        get_process_pool.clear()
+        raise
+    finally:
+        if profiler is not None: profiler.disable()
+    result['report'] = report
+    if profiler is not None:
+        stats_text = io.StringIO()
+        pstats.Stats(profiler, stream=stats_text).sort_stats('cumulative').print_stats(30)
+        profile_path = os.path.join(CACHE_DIR, f"profile-{report.run_id}.prof")
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            profiler.dump_stats(profile_path)
+        except OSError:
+            profile_path = None
+        result['profile'] = (stats_text.getvalue(), profile_path)
+    if result_key is not None: result_cache.put(result_key, result)
+    return result, result['added'], False
+
 if files:
+    job = None
     try:
-        combined_list = []
-        for file in files:
-            if file.name.endswith('.csv'):
-                data = pd.read_csv(file)
+        uploads = [(f.name, f.getvalue()) for f in files]
+        digests = [file_digest(payload) for _, payload in uploads]
+        fuzzy = FuzzyMatcher(fuzzy_threshold) if fuzzy_threshold else None
+
+        result_key = None if append_mode else (tuple(digests), all_sheets, fuzzy_threshold, backend, dedupe)
+        # The run happens on a worker and its outcome waits in session state; reruns of this script only check on it
+        job_key = (tuple(digests), all_sheets, fuzzy_threshold, backend, dedupe, append_mode, profile_run, measure_memory)
+        current = st.session_state.get('cho_job')
+        job = current[1] if current is not None and current[0] == job_key else None
+        if job is None:
+            result = result_cache.get(result_key) if result_key is not None else None
+            if profile_run and result is not None and 'profile' not in result: result = None
+            if result is None:
+                if current is not None and not current[1].done: current[1].cancel()
+                run = partial(process, uploads=uploads, digests=digests, all_sheets=all_sheets, fuzzy=fuzzy, backend=backend,
+                              dedupe=dedupe, append_mode=append_mode, profile_run=profile_run, result_key=result_key)
+                job = BackgroundJob(run, get_job_executor(), planned_steps(len(uploads), append_mode, dedupe), track_memory=measure_memory)
+                st.session_state['cho_job'] = (job_key, job)
+        if job is not None:
+            if not job.done:
+                show_progress(job)
+                st.stop()
+            result, added, from_cache = job.result()
+        else:
+            added, from_cache = [], True
+        if added: st.caption(f"Appended {len(added)} new file(s): {', '.join(added)}")
+
+        st.success(f"Merged into {result['n_files']} file. Summaries Generated!")
+        stats = result['address_stats']
+        if 'fuzzy_candidates' in stats:
+            st.caption(f"Fuzzy matching resolved {stats['fuzzy_matched']} of {stats['fuzzy_candidates']} otherwise-TRANSIENT "
+                       f"addresses ({stats['fuzzy_match_rate']:.0%}), covering {stats['fuzzy_rows_matched']} rows.")
+        if result['unknown_columns']:
+            with st.expander(f"Skipped columns: {len(result['unknown_columns'])} file(s) have headers outside the record schema"):
+                st.dataframe(pd.DataFrame([{'File': name, 'Columns not read': ', '.join(headers)}
+                                           for name, headers in result['unknown_columns'].items()]), use_container_width=True)
+        if result['duplicates'] is not None and len(result['duplicates']):
+            with st.expander(f"Merged duplicates: {len(result['duplicates'])} birth record(s) repeated an earlier one and were counted once"):
+                st.dataframe(result['duplicates'], use_container_width=True)
+        tab_month, tab_brgy, tab_drill = st.tabs(["Summary per Month", "Annual Summary", "Drill-down"])
+        with tab_month:
+            st.dataframe(result['monthly'], use_container_width=True)
+        with tab_brgy:
+            st.dataframe(result['annual'], use_container_width=True)
+        with tab_drill:
+            # Answered from the month x barangay cube only; raw rows are not touched again
+            cube = result['cube']
+            filters = {}
+            years = cube_values(cube, 'YEAR')
+            if years:
+                year = st.selectbox("Year:", ["All years"] + years)
+                if year != "All years": filters['YEAR'] = year
+            view = st.radio("View:", ["One barangay's monthly trend", "One month's barangay breakdown"], horizontal=True)
+            pick_dim, show_dim = ('ADDRESS', 'MONTH') if view.startswith("One barangay") else ('MONTH', 'ADDRESS')
+            choices = cube_values(cube, pick_dim, filters)
+            if not choices or show_dim not in cube.index.names:
+                st.caption("These records have no MONTH and barangay columns to drill into.")
             else:
-                data = pd.read_excel(file)
-            
-            # Auto-Clean Column Names
-            data.columns = [str(c).upper().strip() for c in data.columns]
-            
-            # Flexible Mapping to match your Raw Data file
-            mapping = {
-                'PLACE OF DELIVERY': 'PLACE_OF_DELIVERY',
-                'DATE OF BIRTH': 'DATE',
-                'MOTHER\'S NAME': 'MOTHER_NAME',
-                'WGT. IN GRAMS': 'WGT. IN GRAMS'
-            }
-            data = data.rename(columns=mapping)
-            combined_list.append(data)
-
-        # AUTO-MERGE
-        full_raw = pd.concat(combined_list, ignore_index=True, sort=False)
-        
-        # Clean Address and PII
-        if 'ADDRESS' in full_raw.columns:
-            full_raw['ADDRESS'] = full_raw.apply(process_strict_address, axis=1)
-        
-        pii = ["NAME", "MOTHER_NAME", "SPECIFIC ADDRESS"]
-        full_raw_clean = full_raw.drop(columns=[c for c in pii if c in full_raw.columns])
-
-        # GENERATE SUMMARIES
-        df_monthly = generate_health_summary(full_raw_clean, group_by_col='MONTH')
-        df_annual = generate_health_summary(full_raw_clean, group_by_col='ADDRESS')
-
-        st.success(f"Merged into {len(combined_list)} file. Summaries Generated!")
-        st.dataframe(df_monthly, use_container_width=True)
-
-        # EXCEL EXPORT
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-            df_monthly.to_excel(writer, sheet_name='Summary per Month', index=False)
-            df_annual.to_excel(writer, sheet_name='Annual Summary', index=False)
-            full_raw_clean.to_excel(writer, sheet_name='Merged Raw Data', index=False)
-            
-            # Formatting
-            workbook = writer.book
-            header_fmt = workbook.add_format({'bold': True, 'bg_color': '#D7E4BC', 'border': 1})
-            for sheetname in writer.sheets:
-                sheet = writer.sheets[sheetname]
-                sheet.set_column('A:Z', 18)
-                # Apply header format manually for row 0
-                cols = df_monthly.columns if sheetname == 'Summary per Month' else (df_annual.columns if sheetname == 'Annual Summary' else full_raw_clean.columns)
-                for col_num, value in enumerate(cols):
-                    sheet.write(0, col_num, value, header_fmt)
+                picked = st.selectbox("Barangay:" if pick_dim == 'ADDRESS' else "Month:", choices)
+                st.dataframe(summary_from_cube(cube, show_dim, {**filters, pick_dim: picked}), use_container_width=True)
+
+        # EXPORT: built only when a download is clicked, then kept with the cached result
+        raw_format = st.selectbox("Merged raw data format:", list(RAW_EXPORT_FORMATS))
+        raw_in_workbook = RAW_EXPORT_FORMATS[raw_format] is None
+
+        def workbook_bytes(result=result, raw_in_workbook=raw_in_workbook):
+            key = 'workbook' if raw_in_workbook else 'summary_workbook'
+            if key not in result:
+                with result['report'].stage("Workbook build", key) as stage:
+                    result[key] = build_workbook(result['monthly'], result['annual'], result['raw'] if raw_in_workbook else None)
+                    stage['Rows'] = len(result['raw'])
+            return result[key]
+
+        def raw_bytes(result=result, raw_format=raw_format):
+            if raw_format not in result:
+                with result['report'].stage("Raw export", raw_format) as stage:
+                    result[raw_format] = export_raw(result['raw'], raw_format)
+                    stage['Rows'] = len(result['raw'])
+            return result[raw_format]
 
         st.download_button(
             label="Download Consolidated Reports",
-            data=output.getvalue(),
+            data=workbook_bytes,
             file_name="CHO_Consolidated_Health_Records.xlsx",
             mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
         )
+        if not raw_in_workbook:
+            file_name, mime = RAW_EXPORT_FORMATS[raw_format]
+            st.download_button(label="Download Merged Raw Data", data=raw_bytes, file_name=file_name, mime=mime)
+
+        with st.expander("Diagnostics"):
+            if from_cache: st.caption("Unchanged upload: results served from cache, no stage was re-run. Timings are from the original run.")
+            stages = result['report'].to_frame()
+            st.dataframe(stages, use_container_width=True)
+            st.caption(f"Run {result['report'].run_id}: {stages['Seconds'].sum():.2f}s across {len(stages)} stage entries (per-file reads overlap in parallel).")
+            if 'profile' in result:
+                stats_text, profile_path = result['profile']
+                st.text(stats_text)
+                if profile_path and os.path.exists(profile_path):
+                    with open(profile_path, 'rb') as f:
+                        st.download_button("Download cProfile dump", f.read(), file_name=os.path.basename(profile_path))
 
+    except Cancelled:
+        st.warning("Processing was cancelled.")
+        if st.button("Process again"):
+            st.session_state.pop('cho_job', None)
+            st.rerun()
     except Exception as e:
-        st.error(f"Processing Error: {str(e)}")
\ No newline at end of file
+        report = job.report if job is not None else None
+        failed = f" during {report.failed_stage}" if report is not None and report.failed_stage else ""
+        st.error(f"Processing Error{failed}: {str(e)}")
+        if report is not None:
+            with st.expander("Diagnostics"):
+                st.dataframe(report.to_frame(), use_container_width=True)
\ No newline at end of file
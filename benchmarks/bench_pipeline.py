@@ -0,0 +1,208 @@
+"""Benchmarks for the CHO consolidation pipeline on synthetic station submissions.
+
+    python benchmarks/bench_pipeline.py generate --rows 100000 --files 4 --formats csv xlsx
+    python benchmarks/bench_pipeline.py run --sizes 10000 100000 1000000 --out benchmarks/results/today.json
+    python benchmarks/bench_pipeline.py run --sizes 100000 --compare benchmarks/results/yesterday.json
+
+Each stage is timed on its own: ingestion, merge, address resolution, duplicate
+detection, each generate_health_summary call and the export. Results are written as JSON.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import cho_pipeline as cho  # noqa: E402
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+EXCEL_MAX_ROWS = 1048575
+
+MONTHS = ['JANUARY', 'FEBRUARY', 'MARCH', 'APRIL', 'MAY', 'JUNE',
+          'JULY', 'AUGUST', 'SEPTEMBER', 'OCTOBER', 'NOVEMBER', 'DECEMBER']
+STREETS = ["PUROK 1", "PUROK 4", "ZONE 2", "ZONE 7", "BLK 3 LOT 12", "P-5", "SITIO CENTRO", "NEAR CHAPEL", "ST. JOHN ST."]
+TRANSIENTS = ["TAGOLOAN, MIS. OR.", "OPOL", "EL SALVADOR CITY", "MANOLO FORTICH, BUKIDNON", "ILIGAN CITY", "BALINGASAG"]
+PLACES = ["HOSPITAL", "JRBGH HOSPITAL", "HC", "HEALTH CENTER", "LYING-IN", "LYING IN CLINIC", "HOME", "OTHERS"]
+ATTENDANTS = ["MD", "PHYSICIAN", "MIDWIFE", "RHM", "PHN", "HILOT", "TBA", "NURSE"]
+WEIGHTS = [">2500", "<2500", "GREATER THAN 2500", "LESSER THAN 2500"]
+
+
+def _typo(rng, name):
+    # One dropped, doubled or swapped letter, the kind of slip that shows up in hand-keyed sheets
+    if len(name) < 4: return name
+    i = int(rng.integers(1, len(name) - 1))
+    kind = int(rng.integers(3))
+    if kind == 0: return name[:i] + name[i + 1:]
+    if kind == 1: return name[:i] + name[i] + name[i:]
+    return name[:i - 1] + name[i] + name[i - 1] + name[i + 1:]
+
+
+def generate_records(rows, seed=0):
+    """Raw station records with the headers stations actually send (mapped by the RECORD_SCHEMA aliases on ingest)."""
+    rng = np.random.default_rng(seed)
+    barangays = np.array(cho.CDO_BARANGAYS, dtype=object)
+    # Urban barangays carry most births; a Zipf-like weight gives a realistic skew
+    weights = 1.0 / np.arange(1, len(barangays) + 1) ** 0.8
+    brgy = barangays[rng.choice(len(barangays), size=rows, p=weights / weights.sum())]
+
+    kind = rng.choice(5, size=rows, p=[0.70, 0.10, 0.08, 0.07, 0.05])  # exact, sitio, typo, transient, missing
+    address = brgy.copy()
+    specific = np.array(STREETS, dtype=object)[rng.integers(len(STREETS), size=rows)]
+    sitios = np.array(list(cho.SUB_BRGY_MAP), dtype=object)
+    sitio_rows = kind == 1
+    specific[sitio_rows] = sitios[rng.integers(len(sitios), size=sitio_rows.sum())]
+    address[sitio_rows] = "CAGAYAN DE ORO CITY"
+    typo_rows = np.flatnonzero(kind == 2)
+    typo_names = np.unique(address[typo_rows])
+    typo_variants = {n: [_typo(rng, n) for _ in range(4)] for n in typo_names}
+    address[typo_rows] = [typo_variants[n][int(j)] for n, j in zip(address[typo_rows], rng.integers(4, size=len(typo_rows)))]
+    transient_rows = kind == 3
+    address[transient_rows] = np.array(TRANSIENTS, dtype=object)[rng.integers(len(TRANSIENTS), size=transient_rows.sum())]
+    missing_rows = kind == 4
+    address[missing_rows] = None
+    specific[missing_rows] = None
+    lower = rng.random(rows) < 0.15
+    address[lower] = [a.title() if isinstance(a, str) else a for a in address[lower]]
+
+    birth = pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 366, size=rows), unit="D")
+    grams = rng.normal(3000, 450, size=rows).round().astype(int)
+    wgt = np.where(rng.random(rows) < 0.5, np.where(grams >= 2500, ">2500", "<2500"),
+                   np.array(WEIGHTS, dtype=object)[rng.integers(len(WEIGHTS), size=rows)])
+    ages = rng.normal(27, 6, size=rows).round().clip(12, 49).astype(object)
+    ages[rng.random(rows) < 0.01] = None
+
+    records = pd.DataFrame({
+        "NAME": [f"CHILD {i}" for i in range(rows)],
+        "Mother's Name": [f"MOTHER {i % (rows // 2 + 1)}" for i in range(rows)],
+        "Date of Birth": birth,
+        "MONTH": np.array(MONTHS, dtype=object)[birth.month.to_numpy() - 1],
+        "ADDRESS": address,
+        "SPECIFIC ADDRESS": specific,
+        "GENDER": rng.choice(np.array(["M", "F", "MALE", "FEMALE"], dtype=object), size=rows, p=[0.4, 0.4, 0.1, 0.1]),
+        "WGT. IN GRAMS": wgt,
+        "Place of Delivery": np.array(PLACES, dtype=object)[rng.integers(len(PLACES), size=rows)],
+        "ATTENDANT": np.array(ATTENDANTS, dtype=object)[rng.integers(len(ATTENDANTS), size=rows)],
+        "AGE": ages,
+        "GOV/PRI": rng.choice(np.array(["GOV", "PRI"], dtype=object), size=rows, p=[0.6, 0.4]),
+    })
+    # The last 3% are births a second station reported again, a third of them with the mother's name mistyped
+    repeats = np.arange(rows - rows * 3 // 100, rows)
+    records.iloc[repeats] = records.iloc[rng.integers(0, max(rows - len(repeats), 1), size=len(repeats))].to_numpy()
+    mistyped = repeats[rng.random(len(repeats)) < 1 / 3]
+    records.loc[mistyped, "Mother's Name"] = [_typo(rng, n) for n in records.loc[mistyped, "Mother's Name"]]
+    return records
+
+
+def write_fixtures(rows, files=1, formats=("csv",), seed=0, directory=FIXTURE_DIR):
+    """Splits one synthetic data set into station files; returns the written paths."""
+    os.makedirs(directory, exist_ok=True)
+    records = generate_records(rows, seed=seed)
+    paths = []
+    for part, chunk in enumerate(np.array_split(np.arange(rows), files)):
+        frame = records.iloc[chunk]
+        stem = os.path.join(directory, f"cho_{rows}_{part + 1:02d}")
+        if "csv" in formats:
+            frame.to_csv(stem + ".csv", index=False)
+            paths.append(stem + ".csv")
+        if "xlsx" in formats:
+            if len(frame) > EXCEL_MAX_ROWS:
+                print(f"skipping {stem}.xlsx: {len(frame)} rows exceed an Excel sheet", file=sys.stderr)
+                continue
+            frame.to_excel(stem + ".xlsx", index=False)
+            paths.append(stem + ".xlsx")
+    return paths
+
+
+def _timed(results, rows, stage, fn):
+    start = time.perf_counter()
+    value = fn()
+    seconds = time.perf_counter() - start
+    results.append({"rows": rows, "stage": stage, "seconds": round(seconds, 4)})
+    print(f"{rows:>10}  {stage:<22} {seconds:9.3f}s")
+    return value
+
+
+def bench_size(rows, files=4, fmt="csv", seed=0, backend="pandas"):
+    results = []
+    paths = write_fixtures(rows, files=files, formats=(fmt,), seed=seed)
+    uploads = cho.load_uploads(paths)
+    engine = cho.get_backend(backend)
+    frames = _timed(results, rows, "ingest", lambda: cho.read_uploads(uploads, backend=backend))
+    full_raw = _timed(results, rows, "merge", lambda: pd.concat(frames, ignore_index=True, sort=False))
+    del frames
+    full_raw["ADDRESS"] = _timed(results, rows, "resolve_addresses", lambda: cho.resolve_addresses(full_raw, backend=engine))
+    found = _timed(results, rows, "find_duplicates", lambda: cho.find_duplicates(full_raw))
+    full_raw = full_raw.drop(index=found["Row"]).reset_index(drop=True)
+    clean = _timed(results, rows, "compact_records", lambda: cho.compact_records(full_raw))
+    del full_raw
+    _timed(results, rows, "classify_aggregate", lambda: engine.build_cube(clean))
+    monthly = _timed(results, rows, "summary_month", lambda: cho.generate_health_summary(clean, group_by_col="MONTH"))
+    annual = _timed(results, rows, "summary_address", lambda: cho.generate_health_summary(clean, group_by_col="ADDRESS"))
+    if rows <= EXCEL_MAX_ROWS:
+        _timed(results, rows, "export_xlsx", lambda: cho.build_workbook(monthly, annual, clean))
+    else:
+        _timed(results, rows, "export_xlsx_summaries", lambda: cho.build_workbook(monthly, annual))
+    _timed(results, rows, "export_parquet", lambda: cho.export_raw(clean, "Parquet"))
+    return results
+
+
+def compare(current, baseline_path):
+    with open(baseline_path) as f: baseline = json.load(f)
+    before = {(r["rows"], r["stage"]): r["seconds"] for r in baseline["results"]}
+    print(f"\n{'rows':>10}  {'stage':<22} {'before':>9} {'after':>9} {'ratio':>7}")
+    for r in current:
+        old = before.get((r["rows"], r["stage"]))
+        if old is None: continue
+        ratio = r["seconds"] / old if old else float("inf")
+        print(f"{r['rows']:>10}  {r['stage']:<22} {old:9.3f} {r['seconds']:9.3f} {ratio:6.2f}x")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the CHO pipeline on synthetic birth records.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    gen = sub.add_parser("generate", help="write synthetic fixture files")
+    gen.add_argument("--rows", type=int, default=100000)
+    gen.add_argument("--files", type=int, default=1)
+    gen.add_argument("--formats", nargs="+", choices=["csv", "xlsx"], default=["csv"])
+    gen.add_argument("--seed", type=int, default=0)
+    gen.add_argument("--dir", default=FIXTURE_DIR)
+    run = sub.add_parser("run", help="time each pipeline stage at one or more sizes")
+    run.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    run.add_argument("--files", type=int, default=4, help="station files each size is split into")
+    run.add_argument("--format", choices=["csv", "xlsx"], default="csv")
+    run.add_argument("--seed", type=int, default=0)
+    run.add_argument("--backend", choices=list(cho.BACKENDS), default="pandas", help="execution backend to time")
+    run.add_argument("--out", default=None, help="results JSON (default: benchmarks/results/<timestamp>.json)")
+    run.add_argument("--compare", default=None, help="earlier results JSON to compare against")
+    args = parser.parse_args(argv)
+
+    if args.command == "generate":
+        for path in write_fixtures(args.rows, args.files, args.formats, args.seed, args.dir): print(path)
+        return 0
+
+    results = []
+    for rows in args.sizes:
+        results.extend(bench_size(rows, files=args.files, fmt=args.format, seed=args.seed, backend=args.backend))
+    out = args.out or os.path.join(RESULTS_DIR, datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+    if os.path.dirname(out): os.makedirs(os.path.dirname(out), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump({
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(), "pandas": pd.__version__, "machine": platform.platform(),
+            "cpus": os.cpu_count(), "backend": args.backend, "format": args.format, "files": args.files, "seed": args.seed,
+            "results": results,
+        }, f, indent=2)
+    print(f"results -> {out}")
+    if args.compare: compare(results, args.compare)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
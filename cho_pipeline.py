@@ -0,0 +1,1753 @@
+"""CHO birth-record consolidation pipeline: ingest, address cleaning, summaries and export.
+
+Used by the Streamlit app (app_1.py) and runnable headless:
+
+    python cho_pipeline.py "submissions/2024/*.xlsx" -o CHO_2024.xlsx
+    python cho_pipeline.py submissions/2023 submissions/2024 --per-directory --out-dir reports
+"""
+import argparse
+import glob
+import hashlib
+import importlib.util
+import io
+import json
+import logging
+import math
+import multiprocessing
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+import tracemalloc
+import zipfile
+from collections import Counter, OrderedDict, defaultdict
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import xlsxwriter
+
+# --- 1. REFERENCE DATA ---
+CDO_BARANGAYS = [
+    "AGUSAN", "BAIKINGON", "BALUBAL", "BALULANG", "BAYABAS", "BAYANGA", "BESIGAN", 
+    "BONBON", "BUGO", "BUHUAWEN", "BULUA", "CAMAMAN-AN", "CANITOAN", "CARMEN", 
+    "CONSOLACION", "CUGMAN", "DANSOLIHON", "F.S. CATANICO", "GUSA", "INDAHAG", 
+    "IPONAN", "KAUSWAGAN", "LAPASAN", "LUMBAMBIA", "LUMBIA", "MACABALAN", 
+    "MACASANDIG", "MAGSAYSAY", "MAMBUAYA", "NAZARETH", "PAGALUNGAN", "PAGATPAT", 
+    "PATAG", "PIGSAG-AN", "PUERTO", "PUNTOD", "SAN SIMON", "TABLON", "TAGLIMAO", 
+    "TAGPANGI", "TIGNAPOLOAN", "TUBURAN", "TUMPAGON"
+]
+for i in range(1, 41):
+    CDO_BARANGAYS.append(f"BARANGAY {i}")
+
+SUB_BRGY_MAP = {
+    "CALAANAN": "CANITOAN", "PASIL": "KAUSWAGAN", "AGORA": "LAPASAN",
+    "MACANHAN": "CARMEN", "ORO HABITAT": "CANITOAN"
+}
+
+# --- 2. CLEANING LOGIC ---
+def _word_alternation(names):
+    # Zero-width lookahead scans every start position, so overlapping names all get seen;
+    # alternation order is list order, so the earliest-listed name wins at any one position.
+    return re.compile(r'(?=\b(' + '|'.join(re.escape(n) for n in names) + r')\b)')
+
+SITIO_PATTERN = _word_alternation(SUB_BRGY_MAP)
+BRGY_PATTERN = _word_alternation(CDO_BARANGAYS)
+SITIO_RANK = {s: i for i, s in enumerate(SUB_BRGY_MAP)}
+BRGY_RANK = {b: i for i, b in enumerate(CDO_BARANGAYS)}
+
+def _address_text(df):
+    # Same text the old per-row check built: str(value).upper().strip() per column, space-joined
+    parts = []
+    for col in ['ADDRESS', 'SPECIFIC ADDRESS']:
+        if col in df.columns: parts.append(df[col].map(str).str.upper().str.strip())
+        else: parts.append(pd.Series('', index=df.index, dtype=object))
+    return (parts[0] + ' ' + parts[1]).str.strip()
+
+def _first_listed_match(text, pattern, rank):
+    # Every hit in every row, then keep the one that comes first in the reference list
+    if text.empty: return pd.Series(index=text.index, dtype=object)
+    hits = text.str.extractall(pattern)[0]
+    if hits.empty: return pd.Series(index=text.index, dtype=object)
+    names = list(rank)
+    best = hits.map(rank).groupby(level=0).min()
+    return best.map(lambda i: names[i]).reindex(text.index).astype(object)
+
+def _match_reference(full_text):
+    # Barangay of the first listed sitio in the text, else the first listed barangay; NaN where neither occurs
+    resolved = _first_listed_match(full_text, SITIO_PATTERN, SITIO_RANK).map(SUB_BRGY_MAP)
+    pending = resolved.isna()
+    return resolved.fillna(_first_listed_match(full_text[pending], BRGY_PATTERN, BRGY_RANK))
+
+def _resolve_text(full_text, backend=None):
+    """Vectorized barangay resolution: sitio first, then first barangay in list order, then MISSING/TRANSIENT."""
+    resolved = get_backend(backend).match_reference(full_text).fillna("TRANSIENT")
+    return resolved.mask(full_text.isin(["NAN", "NONE", ""]), "MISSING")
+
+def _unique_address_rows(df):
+    # Positions of one representative row per distinct (ADDRESS, SPECIFIC ADDRESS) pair, and each row's pair
+    codes = np.zeros(len(df), dtype=np.int64)
+    for col in ['ADDRESS', 'SPECIFIC ADDRESS']:
+        if col not in df.columns: continue
+        col_codes, col_uniques = pd.factorize(df[col], use_na_sentinel=False)
+        codes = codes * max(len(col_uniques), 1) + col_codes
+    _, first, inverse = np.unique(codes, return_index=True, return_inverse=True)
+    return first, inverse
+
+def resolve_addresses(df, cache=None, fuzzy=None, stats=None, backend=None):
+    """Resolves each distinct address pair once (consulting the on-disk cache first) and maps results back to rows.
+
+    With a FuzzyMatcher, distinct texts that would fall through to TRANSIENT get one more, typo-tolerant look.
+    Counts of what happened are written into the optional stats dict.
+    """
+    first, inverse = _unique_address_rows(df)
+    full_text = _address_text(df.iloc[first]).reset_index(drop=True)
+    known = cache.lookup(full_text.unique()) if cache is not None else {}
+    resolved = full_text.map(known).astype(object)
+    pending = resolved.isna()
+    if pending.any():
+        fresh = _resolve_text(full_text[pending], backend)
+        resolved[pending] = fresh
+        if cache is not None: cache.store(zip(full_text[pending], fresh))
+    if stats is not None: stats.update(unique_addresses=len(full_text), cache_hits=int((~pending).sum()))
+    if fuzzy is not None:
+        transient = resolved == "TRANSIENT"
+        matches = full_text[transient].map(fuzzy.match)
+        matched = matches.notna()
+        resolved[matches[matched].index] = matches[matched]
+        if stats is not None:
+            rows_per_text = np.bincount(inverse, minlength=len(full_text))
+            stats.update(fuzzy_candidates=int(transient.sum()), fuzzy_matched=int(matched.sum()),
+                         fuzzy_rows_matched=int(rows_per_text[matches[matched].index].sum()))
+    return pd.Series(resolved.to_numpy(dtype=object)[inverse], index=df.index, name='ADDRESS')
+
+def _name_key(text):
+    # Letters and digits only, so "CAMAMAN AN", "CAMAMAN-AN" and "CAMAMANAN" compare equal
+    return re.sub(r'[^A-Z0-9]', '', text.upper())
+
+def _edit_distance(a, b):
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        previous = current
+    return previous[-1]
+
+class FuzzyMatcher:
+    """Typo-tolerant barangay lookup through a character-trigram inverted index over sitio and barangay names.
+
+    Each 1-3 word span of an address only gets edit-distance checks against names sharing enough trigrams
+    to possibly clear the threshold (the q-gram lemma), never against the whole reference list.
+    Similarity is 1 - edit distance / longer length; digits must match exactly so BARANGAY 41 never becomes BARANGAY 4.
+    """
+    N = 3
+
+    def __init__(self, threshold=0.85, max_words=3):
+        self.threshold = threshold
+        self.max_words = max_words
+        # Sitios first, then barangays in list order: ties go to the same priority the exact matcher uses
+        self.targets = [(_name_key(s), b) for s, b in SUB_BRGY_MAP.items()] + [(_name_key(b), b) for b in CDO_BARANGAYS]
+        self.index = defaultdict(list)
+        for target_id, (key, _) in enumerate(self.targets):
+            for gram, count in self._grams(key).items(): self.index[gram].append((target_id, count))
+        self._memo = {}
+
+    @classmethod
+    def _grams(cls, key):
+        return Counter(key[i:i + cls.N] for i in range(len(key) - cls.N + 1))
+
+    def _span_keys(self, text):
+        words = text.split()
+        for size in range(1, self.max_words + 1):
+            for i in range(len(words) - size + 1):
+                key = _name_key(' '.join(words[i:i + size]))
+                if len(key) >= 4: yield key
+
+    def match(self, text):
+        """Best barangay for a free-text address, or None when nothing clears the threshold."""
+        if text in self._memo: return self._memo[text]
+        best, best_score, best_id = None, None, None
+        for key in set(self._span_keys(text)):
+            digits = re.sub(r'\D', '', key)
+            shared = Counter()
+            for gram, count in self._grams(key).items():
+                for target_id, target_count in self.index.get(gram, ()): shared[target_id] += min(count, target_count)
+            for target_id in sorted(shared):
+                target_key, barangay = self.targets[target_id]
+                longest = max(len(key), len(target_key))
+                # The epsilon keeps (1 - 0.9) * 10 from rounding down to 0 edits
+                allowed = int((1 - self.threshold) * longest + 1e-9)
+                if shared[target_id] < longest - self.N + 1 - allowed * self.N: continue
+                if re.sub(r'\D', '', target_key) != digits: continue
+                distance = _edit_distance(key, target_key)
+                if distance > allowed: continue
+                score = 1 - distance / longest
+                if best is None or score > best_score or (score == best_score and target_id < best_id):
+                    best, best_score, best_id = barangay, score, target_id
+        self._memo[text] = best
+        return best
+
+
+def reference_fingerprint():
+    # Changes whenever a barangay or sitio is added, renamed or reordered (order decides priority)
+    reference = json.dumps([CDO_BARANGAYS, list(SUB_BRGY_MAP.items())])
+    return hashlib.sha256(reference.encode()).hexdigest()
+
+class AddressCache:
+    """SQLite store of normalized address text -> barangay, shared across sessions and runs.
+
+    Addresses are personal data, so the table holds the SHA-256 of each normalized text, never the text itself.
+    Rows are tagged with the reference fingerprint; rows from older reference lists are purged on open.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.fingerprint = reference_fingerprint()
+        if os.path.dirname(path): os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as con:
+            con.execute("CREATE TABLE IF NOT EXISTS addresses "
+                        "(reference TEXT, digest TEXT, barangay TEXT NOT NULL, PRIMARY KEY (reference, digest))")
+            con.execute("DELETE FROM addresses WHERE reference != ?", (self.fingerprint,))
+
+    @contextmanager
+    def _connect(self):
+        con = sqlite3.connect(self.path, timeout=30)
+        try:
+            with con: yield con
+        finally:
+            con.close()
+
+    @staticmethod
+    def _digest(text):
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    def lookup(self, texts, chunk_size=500):
+        digests = {self._digest(text): text for text in texts}
+        found = {}
+        keys = list(digests)
+        with self._connect() as con:
+            for i in range(0, len(keys), chunk_size):
+                chunk = keys[i:i + chunk_size]
+                rows = con.execute(f"SELECT digest, barangay FROM addresses WHERE reference = ? AND digest IN ({','.join('?' * len(chunk))})",
+                                   [self.fingerprint, *chunk])
+                found.update((digests[digest], brgy) for digest, brgy in rows)
+        return found
+
+    def store(self, pairs):
+        with self._connect() as con:
+            con.executemany("INSERT OR REPLACE INTO addresses VALUES (?, ?, ?)",
+                            ((self.fingerprint, self._digest(text), brgy) for text, brgy in pairs))
+
+# Duplicate births: one birth reported by several stations (a hospital and the barangay health station)
+# Neighbours in name order each row is compared with inside a DATE/barangay/GENDER block, so a block costs
+# O(rows * NEAR_WINDOW) rather than O(rows^2); smaller blocks are compared in full
+NEAR_WINDOW = 50
+_NAME_CHARS = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789'
+
+def _person_key(text):
+    # Letters and digits only, words in sorted order: "DELA CRUZ, MARIA" and "Maria Dela Cruz" agree
+    return ''.join(sorted(re.findall(r'[A-Z0-9]+', text.upper())))
+
+def _date_keys(values):
+    # Calendar day when the cell parses as a date (as parse_dates reads it), else its trimmed text
+    parsed = pd.DatetimeIndex(_parse_date_values(values)[0])
+    return np.where(parsed.isna(), pd.Index(values).astype(str).str.strip().str.upper(), parsed.strftime('%Y-%m-%d'))
+
+def _keyed(col, convert):
+    # convert() runs once per distinct value; missing cells key as ''
+    codes, uniques = pd.factorize(col)
+    keys = np.append(np.asarray(convert(uniques), dtype=object), '')
+    return pd.Series(keys[codes], index=col.index)
+
+def duplicate_key_frame(df):
+    """Normalized mother's name, DATE, barangay, GENDER and child's name ('' when blank) of the rows that have a
+    mother's name and DATE (None when the records lack either column)."""
+    if 'MOTHER_NAME' not in df.columns or 'DATE' not in df.columns: return None
+    key = pd.DataFrame({
+        'MOTHER_NAME': _keyed(df['MOTHER_NAME'], lambda u: [_person_key(str(v)) for v in u]),
+        'DATE': _keyed(df['DATE'], _date_keys),
+        'ADDRESS': _keyed(df['ADDRESS'], lambda u: [str(v) for v in u]) if 'ADDRESS' in df.columns else '',
+        'GENDER': _keyed(df['GENDER'], lambda u: [str(v).strip()[:1].upper() for v in u]) if 'GENDER' in df.columns else '',
+        'NAME': _keyed(df['NAME'], lambda u: [_person_key(str(v)) for v in u]) if 'NAME' in df.columns else '',
+    }, index=df.index)
+    return key[(key['MOTHER_NAME'] != '') & (key['DATE'] != '')]
+
+def _char_counts(names):
+    # Letter and digit counts per name (one row each), as the bag distance needs them
+    table = np.zeros(256, dtype=np.int64)
+    table[np.frombuffer(_NAME_CHARS.encode(), dtype=np.uint8)] = np.arange(len(_NAME_CHARS))
+    lengths = [len(n) for n in names]
+    chars = table[np.frombuffer(''.join(names).encode(), dtype=np.uint8)]
+    owner = np.repeat(np.arange(len(names)), lengths)
+    return np.bincount(owner * len(_NAME_CHARS) + chars, minlength=len(names) * len(_NAME_CHARS)).reshape(len(names), len(_NAME_CHARS))
+
+def _neighbourhood_ranks(block, names, name_ids):
+    # Row orders for the near-repeat search: by block, then by mother's name read forwards and backwards, so names
+    # that differ near the start still end up close in one of them
+    orders = []
+    for keys in (names, [n[::-1] for n in names]):
+        name_rank = np.empty(len(keys), dtype=np.int64)
+        name_rank[np.argsort(np.asarray(keys, dtype=object), kind='stable')] = np.arange(len(keys))
+        orders.append(np.lexsort((name_rank[name_ids], block)))
+    return orders
+
+def duplicate_hashes(key):
+    return pd.util.hash_pandas_object(key, index=False).to_numpy()
+
+def find_duplicates(df, threshold=0.85, window=NEAR_WINDOW):
+    """Rows that report the same birth as an earlier row: same mother, DATE, barangay, GENDER and child's name.
+
+    The normalized fields hash into one uint64 per row, so exact repeats are a hash-index lookup. Near repeats
+    (a misspelled or reordered mother's name, or a child's name left blank on one report) are only searched within
+    blocks sharing DATE, barangay and GENDER, never pairwise across the file; names there match at
+    1 - edit distance / longer length >= threshold, with the same digits. Blocks of more than window + 1 rows
+    only compare each name with its window nearest neighbours in name order (forwards and backwards). Two rows whose child's names are both
+    given and differ are never merged (twins), and TRANSIENT or MISSING addresses form no near-repeat block.
+    Returns the positions of the repeats ('Row'), the row each one repeats ('Kept'), 'Match' and 'Similarity'.
+    """
+    key = duplicate_key_frame(df.reset_index(drop=True))
+    if key is None or key.empty: return _duplicate_frame([], [], [], [])
+    position = pd.Series(key.index, index=key.index)
+    first = position.groupby(duplicate_hashes(key), sort=False).transform('first')
+    exact = first != position
+
+    # Near repeats: candidate pairs are rows d <= window apart within a block ordered by name, generated for all
+    # blocks at once. The bag distance (a lower bound on edit distance) discards almost every pair in bulk, so
+    # edit distances are only computed for the few that could clear the threshold.
+    distinct = key[~exact & ~key['ADDRESS'].isin(['TRANSIENT', 'MISSING', ''])]
+    block = duplicate_hashes(distinct[['DATE', 'ADDRESS', 'GENDER']])
+    order = np.lexsort((distinct.index.to_numpy(), block))
+    rows, block = distinct.index.to_numpy()[order], block[order]
+    name_ids, names = pd.factorize(distinct['MOTHER_NAME'].to_numpy()[order])
+    counts, lengths = _char_counts(names), np.fromiter(map(len, names), dtype=np.int64, count=len(names))
+    # Digits must match exactly (as in FuzzyMatcher): "MOTHER 770" and "MOTHER 370" are two mothers
+    digit_ids = pd.factorize(np.array([re.sub(r'\D', '', n) for n in names], dtype=object))[0]
+    child = distinct['NAME'].to_numpy()[order]
+    child_ids, blank_child = pd.factorize(child)[0], child == ''
+    starts = np.r_[True, block[1:] != block[:-1]]
+    rank = np.arange(len(rows)) - np.maximum.accumulate(np.where(starts, np.arange(len(rows)), 0))
+    candidates = set()
+    for by_name in _neighbourhood_ranks(block, names, name_ids):
+        live, d = np.flatnonzero(rank >= 1), 1
+        while len(live) and d <= window:
+            # Rows sort by position within a block, so the larger index of a pair is the later row
+            a, b = by_name[live], by_name[live - d]
+            later, earlier = np.maximum(a, b), np.minimum(a, b)
+            allowed = ((1 - threshold) * np.maximum(lengths[name_ids[later]], lengths[name_ids[earlier]]) + 1e-9).astype(np.int64)
+            diff = counts[name_ids[later]] - counts[name_ids[earlier]]
+            bag = np.maximum(np.clip(diff, 0, None).sum(axis=1), np.clip(-diff, 0, None).sum(axis=1))
+            close = (np.abs(lengths[name_ids[later]] - lengths[name_ids[earlier]]) <= allowed) & (bag <= allowed)
+            close &= digit_ids[name_ids[later]] == digit_ids[name_ids[earlier]]
+            close &= (child_ids[later] == child_ids[earlier]) | blank_child[later] | blank_child[earlier]
+            candidates.update(zip(later[close].tolist(), earlier[close].tolist()))
+            d += 1
+            live = live[rank[live] >= d]
+    scored = []
+    for i, j in candidates:
+        longest = max(len(names[name_ids[i]]), len(names[name_ids[j]]))
+        score = 1 - _edit_distance(names[name_ids[i]], names[name_ids[j]]) / longest
+        if score >= threshold: scored.append((rows[i], -score, rows[j]))
+    # In row order, each repeat points at its most similar earlier row that was itself kept (the first on ties)
+    near = {}
+    for row, score, kept in sorted(scored):
+        if row not in near and kept not in near: near[row] = (kept, round(-score, 3))
+
+    # An exact repeat of a near repeat points at the row that was finally kept
+    exact_kept = [near.get(k, (k,))[0] for k in first[exact]]
+    return _duplicate_frame(position[exact].tolist() + list(near), exact_kept + [k for k, _ in near.values()],
+                            ['exact'] * len(exact_kept) + ['near'] * len(near),
+                            [1.0] * len(exact_kept) + [s for _, s in near.values()])
+
+def _duplicate_frame(rows, kept, match, similarity):
+    found = pd.DataFrame({'Row': np.asarray(rows, dtype='int64'), 'Kept': np.asarray(kept, dtype='int64'),
+                          'Match': pd.Series(match, dtype=object), 'Similarity': np.asarray(similarity, dtype='float64')})
+    return found.sort_values('Row', ignore_index=True)
+
+# --- 3. SUMMARY ENGINE (Calculates values from Raw Data) ---
+MONTHS_ORDER = ['JANUARY', 'FEBRUARY', 'MARCH', 'APRIL', 'MAY', 'JUNE',
+                'JULY', 'AUGUST', 'SEPTEMBER', 'OCTOBER', 'NOVEMBER', 'DECEMBER']
+# Integer month keys: sorting and storage go by number, the name is only the label
+MONTH_NUMBERS = {m: i for i, m in enumerate(MONTHS_ORDER, 1)}
+MONTH_DTYPE = pd.CategoricalDtype(MONTHS_ORDER, ordered=True)
+
+SUMMARY_COLUMNS = [
+    'Male', 'Female', 'Total Count', '>2500g', '<2500g', 'Total W',
+    'Hospital', 'Health Center', 'Lying-In', 'Total Facility', 'Home/Other', 'Total P', '% FBD',
+    'MD/Physician', 'Midwife/Nurse', 'Total Skilled', 'Non-Skilled', 'Total A', '% SBA',
+    '10-14Y', '15-19Y', '20-24Y', '25+Y', 'Total Age', '% Teenage', 'Govt', 'Private', 'Total G'
+]
+
+# Text rules as (flag, column, kind, pattern): 'prefix' is a case-sensitive startswith on str(value),
+# 'contains' a case-insensitive regex search. Every backend evaluates this same table.
+TEXT_RULES = [
+    ('m', 'GENDER', 'prefix', 'M'),
+    ('f', 'GENDER', 'prefix', 'F'),
+    # Calculations based on strings in your Raw Data
+    ('gt', 'WGT. IN GRAMS', 'contains', 'GREATER|2500'),
+    ('lt', 'WGT. IN GRAMS', 'contains', 'LESSER|2500'),
+    # Place of Delivery Logic
+    ('hosp', 'PLACE_OF_DELIVERY', 'contains', 'HOSP'),
+    ('hc', 'PLACE_OF_DELIVERY', 'contains', 'HC|HEALTH CENTER'),
+    ('lying', 'PLACE_OF_DELIVERY', 'contains', 'LYING'),
+    # Attendant Logic
+    ('md', 'ATTENDANT', 'contains', 'MD|PHYSICIAN'),
+    ('mw', 'ATTENDANT', 'contains', 'MIDWIFE|RHM|PHN'),
+    # Provider Logic
+    ('gov', 'GOV/PRI', 'contains', 'GOV'),
+]
+# Age Logic: (flag, lowest, highest) inclusive, None = open-ended
+AGE_BANDS = [('a1', 10, 14), ('a2', 15, 19), ('a3', 20, 24), ('a4', 25, None)]
+INDICATORS = ['total', 'm', 'f', 'gt', 'lt', 'hosp', 'hc', 'lying', 'md', 'mw', 'a1', 'a2', 'a3', 'a4', 'gov']
+
+def classify_indicators(df):
+    """Flags every row once for each indicator (1 = counts toward it); groups are then just sums."""
+    texts = {col: df[col].astype(str) for col in dict.fromkeys(col for _, col, _, _ in TEXT_RULES)}
+    ages = pd.to_numeric(df['AGE'], errors='coerce').astype('float64')
+    flags = {'total': pd.Series(True, index=df.index)}
+    for flag, col, kind, pattern in TEXT_RULES:
+        if kind == 'prefix': flags[flag] = texts[col].str.startswith(pattern, na=False)
+        else: flags[flag] = texts[col].str.contains(pattern, case=False, na=False)
+    for flag, low, high in AGE_BANDS:
+        flags[flag] = (ages >= low) & (ages <= high) if high is not None else ages >= low
+    return pd.DataFrame({flag: flags[flag] for flag in INDICATORS}, index=df.index).astype('int8')
+
+def summary_from_counts(counts, label):
+    """Builds the report columns from per-group indicator counts (index = group, in report order)."""
+    c = counts.astype('int64')
+    total = c['total']
+    fac_total = c['hosp'] + c['hc'] + c['lying']
+    skilled = c['md'] + c['mw']
+    out = pd.DataFrame({
+        label: list(counts.index), 'Male': c['m'], 'Female': c['f'], 'Total Count': total,
+        '>2500g': c['gt'], '<2500g': c['lt'], 'Total W': total,
+        'Hospital': c['hosp'], 'Health Center': c['hc'], 'Lying-In': c['lying'], 'Total Facility': fac_total,
+        'Home/Other': total - fac_total, 'Total P': total, '% FBD': fac_total / total,
+        'MD/Physician': c['md'], 'Midwife/Nurse': c['mw'], 'Total Skilled': skilled,
+        'Non-Skilled': total - skilled, 'Total A': total, '% SBA': skilled / total,
+        '10-14Y': c['a1'], '15-19Y': c['a2'], '20-24Y': c['a3'], '25+Y': c['a4'], 'Total Age': total,
+        '% Teenage': (c['a1'] + c['a2']) / total,
+        'Govt': c['gov'], 'Private': total - c['gov'], 'Total G': total,
+    })
+    if out.empty: return pd.DataFrame([], columns=[label] + SUMMARY_COLUMNS)
+    return out.reset_index(drop=True)
+
+def _blank(value):
+    return value is None or str(value) in ["MISSING", "nan", "None", "", "<NA>", "NaT"]
+
+def _month_key(group):
+    # Integer sort key of a month group, or of a (year, month) group when several years are reported;
+    # months whose year is unknown come after the dated ones
+    year, month = group if isinstance(group, tuple) else (0, group)
+    return (1, 0) if _blank(year) else (0, int(year)), MONTH_NUMBERS.get(str(month).upper(), 99)
+
+def order_groups(groups, group_by_col):
+    # Filter out empty/missing groups
+    groups = [g for g in groups if not _blank(g[-1] if isinstance(g, tuple) else g)]
+    # Chronological sort for months
+    if group_by_col == 'MONTH': return sorted(groups, key=_month_key)
+    return sorted(groups)
+
+def _group_levels(years, group_by_col):
+    # Months of different years stay apart once the records span more than one YEAR
+    if group_by_col == 'MONTH' and years is not None and pd.Series(years).dropna().nunique() > 1: return ['YEAR', 'MONTH']
+    return [group_by_col]
+
+def group_counts(df, group_by_col, flags=None):
+    """Per-group indicator counts, unfiltered and in first-appearance order; counts from separate batches add up.
+
+    MONTH groups are (YEAR, MONTH) pairs when the records cover several years.
+    """
+    if flags is None: flags = classify_indicators(df)
+    levels = _group_levels(df['YEAR'] if 'YEAR' in df.columns else None, group_by_col)
+    # One pass: every group's counts from a single groupby over the pre-classified flags
+    # dropna=False keeps a dated month whose YEAR is missing; blank groups are dropped when the report is ordered
+    return flags.groupby([df[c] for c in levels] if len(levels) > 1 else df[group_by_col], sort=False, observed=True,
+                         dropna=False).sum()
+
+def _group_label(group):
+    if not isinstance(group, tuple): return group
+    year, month = group
+    return month if _blank(year) else f"{month} {int(year)}"
+
+def summary_from_group_counts(counts, group_by_col):
+    counts = counts.loc[order_groups(counts.index, group_by_col)]
+    label = "Month" if group_by_col == 'MONTH' else "Barangay"
+    if isinstance(counts.index, pd.MultiIndex): counts.index = [_group_label(g) for g in counts.index]
+    return summary_from_counts(counts, label)
+
+def generate_health_summary(df, group_by_col='ADDRESS', flags=None):
+    if group_by_col not in df.columns: return pd.DataFrame()
+    return summary_from_group_counts(group_counts(df, group_by_col, flags), group_by_col)
+
+CUBE_DIMENSIONS = ['YEAR', 'MONTH', 'ADDRESS']
+
+def build_cube(df, flags=None):
+    """Indicator counts for every (year,) month and barangay combination in one groupby; None without any dimension.
+
+    Missing values stay as their own cells, so rolling the cube up to one dimension counts exactly the rows
+    generate_health_summary would.
+    """
+    dims = [c for c in CUBE_DIMENSIONS if c in df.columns]
+    if not dims: return None
+    if flags is None: flags = classify_indicators(df)
+    return flags.groupby([df[c] for c in dims], sort=False, observed=True, dropna=False).sum()
+
+def merge_cubes(cubes):
+    """Adds up cubes from separate batches, even when some batches lack a dimension."""
+    cubes = [c for c in cubes if c is not None]
+    if not cubes: return None
+    frames = [c.reset_index() for c in cubes]
+    dims = [d for d in CUBE_DIMENSIONS if any(d in f.columns for f in frames)]
+    merged = pd.concat(frames, ignore_index=True, sort=False)
+    for d in dims: merged[d] = merged[d].astype(object)
+    return merged.groupby(dims, sort=False, dropna=False)[[c for c in merged.columns if c not in dims]].sum()
+
+def rollup(cube, group_by_col, filters=None, by_year=True):
+    """Per-group counts along one dimension, optionally restricted to {dimension: value} cells; None if absent.
+
+    Like group_counts, MONTH groups are (YEAR, MONTH) pairs when the remaining cells span several years.
+    """
+    if cube is None or group_by_col not in cube.index.names: return None
+    for dim, value in (filters or {}).items():
+        if dim in cube.index.names: cube = cube[cube.index.get_level_values(dim) == value]
+    years = cube.index.get_level_values('YEAR') if by_year and 'YEAR' in cube.index.names else None
+    levels = _group_levels(years, group_by_col)
+    return cube.groupby(level=levels if len(levels) > 1 else group_by_col, sort=False, dropna=False).sum()
+
+def summary_from_cube(cube, group_by_col, filters=None):
+    counts = rollup(cube, group_by_col, filters)
+    if counts is None: return pd.DataFrame()
+    return summary_from_group_counts(counts, group_by_col)
+
+def cube_values(cube, dim, filters=None):
+    """Reportable values of one dimension, in report order, for drill-down pickers."""
+    counts = rollup(cube, dim, filters, by_year=False)
+    return [] if counts is None else order_groups(counts.index, dim)
+
+# --- 4. RECORD SCHEMA AND DIAGNOSTICS ---
+PII_COLUMNS = ["NAME", "MOTHER_NAME", "SPECIFIC ADDRESS"]
+CATEGORY_COLUMNS = ['GENDER', 'GOV/PRI', 'PLACE_OF_DELIVERY', 'ATTENDANT', 'MONTH', 'ADDRESS']
+
+def _compact_age(ages):
+    ages = pd.to_numeric(ages, errors='coerce')
+    whole = ages.dropna()
+    if (whole == whole.round()).all():
+        for dtype in ['Int8', 'Int16']:
+            info = np.iinfo(dtype.lower())
+            if whole.empty or (whole.min() >= info.min and whole.max() <= info.max): return ages.astype(dtype)
+    return ages.astype('float32')
+
+def compact_records(df):
+    """Drops PII and stores the repeated text columns as categoricals and AGE as a small number."""
+    df = df.drop(columns=[c for c in PII_COLUMNS if c in df.columns])
+    for col in CATEGORY_COLUMNS:
+        if col in df.columns: df[col] = df[col].astype('category')
+    if 'AGE' in df.columns: df['AGE'] = _compact_age(df['AGE'])
+    return df
+
+log = logging.getLogger("cho_pipeline")
+
+def _rss_bytes():
+    # Resident set size from /proc (Linux); None elsewhere
+    try:
+        with open('/proc/self/statm') as f: return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError): return None
+
+class Cancelled(Exception):
+    """Raised at the next stage or file boundary of a run whose StageReport was cancelled."""
+
+# tracemalloc is process-wide: a second traced run would reset the first one's peak, or stop tracing under it
+_TRACING_LOCK = threading.Lock()
+
+class StageReport:
+    """Wall time, rows and memory per pipeline stage; every entry is also logged to the "cho_pipeline" logger as JSON.
+
+    track_memory adds tracemalloc figures: peak allocation while the stage ran and the size of the frame it left behind.
+    Only one report traces at a time; another memory-tracked run waits at its first stage until that one is closed.
+    The report doubles as the run's control channel: current names the stage in progress and cancel() stops the run.
+    """
+    def __init__(self, track_memory=False, run_id=None):
+        self.rows = []
+        self.run_id = run_id or datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+        self.failed_stage = None
+        self.current = None
+        self._cancel = threading.Event()
+        self.track_memory = track_memory
+        self._tracing = self._started = False
+        self._trace_lock = threading.Lock()
+
+    def _trace(self):
+        with self._trace_lock:
+            if self._tracing: return
+            self.current = "Waiting for another memory-tracked run"
+            while not _TRACING_LOCK.acquire(timeout=0.2):
+                if self._cancel.is_set(): raise Cancelled("Cancelled while waiting for another memory-tracked run")
+            self.current = None
+            self._tracing = True
+            self._started = not tracemalloc.is_tracing()
+            if self._started: tracemalloc.start()
+
+    def cancel(self):
+        self._cancel.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def check_cancelled(self):
+        if self._cancel.is_set(): raise Cancelled(f"Cancelled before {self.current or 'the first stage'} finished")
+
+    @contextmanager
+    def stage(self, name, detail=None):
+        self.check_cancelled()
+        if self.track_memory and not self._tracing: self._trace()
+        entry = {'Stage': name}
+        if detail is not None: entry['Detail'] = detail
+        outer, self.current = self.current, name if detail is None else f"{name}: {detail}"
+        if self.track_memory:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        rss = _rss_bytes()
+        start = time.perf_counter()
+        try:
+            yield entry
+        except Cancelled:
+            entry['Status'] = 'cancelled'
+            raise
+        except BaseException:
+            self.failed_stage = name
+            entry['Status'] = 'failed'
+            raise
+        finally:
+            self.current = outer
+            entry['Seconds'] = round(time.perf_counter() - start, 4)
+            frame = entry.pop('frame', None)
+            if frame is not None: entry.setdefault('Rows', len(frame))
+            rss_after = _rss_bytes()
+            if rss is not None and rss_after is not None: entry['RSS Δ (MB)'] = round((rss_after - rss) / 1e6, 2)
+            if self.track_memory:
+                current, peak = tracemalloc.get_traced_memory()
+                if frame is not None: entry['Frame (MB)'] = round(frame.memory_usage(deep=True).sum() / 1e6, 2)
+                entry['Peak (MB)'] = round((peak - base) / 1e6, 2)
+                entry['Retained (MB)'] = round((current - base) / 1e6, 2)
+            self.add(entry)
+
+    def add(self, entry):
+        self.rows.append(entry)
+        log.info(json.dumps({'run': self.run_id, **entry}, default=str))
+
+    def to_frame(self):
+        frame = pd.DataFrame(self.rows)
+        leading = [c for c in ['Stage', 'Detail', 'Status', 'Rows', 'Seconds'] if c in frame.columns]
+        return frame[leading + [c for c in frame.columns if c not in leading]]
+
+    def close(self):
+        if self._started: tracemalloc.stop()
+        if self._tracing: _TRACING_LOCK.release()
+        self._tracing = self._started = self.track_memory = False
+        return self.to_frame()
+
+@contextmanager
+def timed_stage(report, name, detail=None):
+    if report is None:
+        yield {}
+    else:
+        with report.stage(name, detail) as entry: yield entry
+
+# --- 5. INGESTION ---
+# Record schema: canonical column -> (header aliases, dtype it is read as); headers match after upper()/strip().
+# 'str' columns reach the indicator rules and the address matcher as cell text; None keeps pandas' inference
+# (AGE, MONTH, YEAR and DATE are converted later). Only these columns are read; other headers are reported.
+RECORD_SCHEMA = {
+    'NAME': (["CHILD'S NAME", 'NAME OF CHILD'], 'str'),
+    'MOTHER_NAME': (["MOTHER'S NAME", 'NAME OF MOTHER'], 'str'),
+    'DATE': (['DATE OF BIRTH', 'BIRTH DATE', 'DOB'], None),
+    'YEAR': ([], None),
+    'MONTH': ([], None),
+    'ADDRESS': (['BARANGAY'], 'str'),
+    'SPECIFIC ADDRESS': (['PUROK/SITIO', 'STREET'], 'str'),
+    'GENDER': (['SEX'], 'str'),
+    'WGT. IN GRAMS': (['WGT IN GRAMS', 'WEIGHT IN GRAMS', 'BIRTH WEIGHT'], 'str'),
+    'PLACE_OF_DELIVERY': (['PLACE OF DELIVERY'], 'str'),
+    'ATTENDANT': (['BIRTH ATTENDANT', 'ATTENDED BY'], 'str'),
+    'AGE': (["MOTHER'S AGE", 'AGE OF MOTHER'], None),
+    'GOV/PRI': (['GOVT/PRIVATE', 'GOV/PRIVATE'], 'str'),
+}
+HEADER_ALIASES = {alias: canonical for canonical, (aliases, _) in RECORD_SCHEMA.items() for alias in [canonical] + aliases}
+# Excel parsing is several times faster on calamine (pip install python-calamine); openpyxl otherwise
+EXCEL_ENGINE = 'calamine' if importlib.util.find_spec('python_calamine') is not None else None
+STRING_DTYPE = pd.Series(['']).dtype
+
+def canonical_column(header):
+    return HEADER_ALIASES.get(str(header).upper().strip())
+
+def read_plan(headers):
+    """{header: canonical name} for the schema columns among a sheet's headers (the first of any duplicates),
+    and the headers that are not read."""
+    names, unknown = {}, []
+    for header in headers:
+        canonical = canonical_column(header)
+        if canonical is None or canonical in names.values(): unknown.append(str(header))
+        else: names[header] = canonical
+    return names, unknown
+
+def schema_dtypes(names):
+    return {header: RECORD_SCHEMA[c][1] for header, c in names.items() if RECORD_SCHEMA[c][1] is not None}
+
+def _column_picker(headers):
+    # usecols callable for pd.read_excel: notes every header and keeps the columns read_plan would
+    taken = set()
+    def pick(header):
+        headers.append(header)
+        canonical = canonical_column(header)
+        if canonical is None or canonical in taken: return False
+        taken.add(canonical)
+        return True
+    return pick
+
+def _as_text(col):
+    return col.astype(str).where(col.notna(), np.nan)
+
+def normalize_columns(data, names):
+    """Canonical column names, and the declared text dtype for columns that were read without one (workbooks)."""
+    data = data.rename(columns=names)
+    for col in data.columns:
+        if RECORD_SCHEMA[col][1] == 'str' and not isinstance(data[col].dtype, pd.StringDtype): data[col] = _as_text(data[col])
+    return data
+
+# Text layouts stations type dates in, most common first: a file's layout is the one parsing most of a sample
+# (month-first wins ties, as on local forms); cells in another layout fall back to per-value inference
+DATE_FORMATS = ['%m/%d/%Y', '%Y-%m-%d', '%Y-%m-%d %H:%M:%S', '%d/%m/%Y', '%m/%d/%y', '%m-%d-%Y', '%d-%m-%Y', '%Y/%m/%d',
+                '%B %d, %Y', '%b %d, %Y', '%d %B %Y', '%d-%b-%y', '%d-%b-%Y', '%Y%m%d']
+EXCEL_EPOCH = pd.Timestamp('1899-12-30')
+# Numbers read as Excel serial days only within plausible birth dates; whole numbers in YEAR_ONLY are a bare year
+EXCEL_SERIALS = (18264, 73050)  # 1950-01-01 .. 2099-12-31
+YEAR_ONLY = (1900, 2100)
+def detect_date_format(texts, sample_size=200, cached=None):
+    """The DATE_FORMATS layout that parses most of a sample of distinct date texts (cached first), or None."""
+    sample = pd.Index(texts[:sample_size])
+    if sample.empty: return None
+    if cached is not None and pd.to_datetime(sample, format=cached, errors='coerce').notna().mean() >= 0.95: return cached
+    parsed = {fmt: pd.to_datetime(sample, format=fmt, errors='coerce').notna().sum() for fmt in DATE_FORMATS}
+    best = max(parsed, key=parsed.get)
+    return best if parsed[best] else None
+
+def _date_numbers(values):
+    # DATE cells as numbers (plain numbers and numeric text); datetimes and other text are NaN
+    values = pd.Index(values, dtype=object)
+    stamp = np.array([isinstance(v, (datetime, date)) for v in values], dtype=bool)
+    return stamp, pd.to_numeric(pd.Series(values).where(~stamp), errors='coerce').to_numpy(dtype='float64')
+
+def _year_only(numbers):
+    return (numbers >= YEAR_ONLY[0]) & (numbers <= YEAR_ONLY[1]) & (numbers == np.floor(numbers))
+
+def _parse_date_values(values, cached=None):
+    # Distinct DATE cells -> (datetime64 values, text layout): datetimes as they are, numbers in EXCEL_SERIALS as
+    # Excel serial days, text by the detected layout and then, for what that misses, pandas' per-value inference.
+    # Bare years and other small numbers are no date (normalize_dates takes YEAR from a bare year)
+    values = pd.Index(values, dtype=object)
+    out = pd.Series(pd.NaT, index=range(len(values)), dtype='datetime64[ns]')
+    stamp, numbers = _date_numbers(values)
+    if stamp.any(): out[stamp] = pd.to_datetime(values[stamp], errors='coerce').as_unit('ns')
+    serial = (numbers >= EXCEL_SERIALS[0]) & (numbers <= EXCEL_SERIALS[1])
+    if serial.any(): out[serial] = EXCEL_EPOCH + pd.to_timedelta(np.floor(numbers[serial]), unit='D')
+    # Numbers above the serial range may still be text layouts such as 20240305
+    rest = ~stamp & ~(numbers < EXCEL_SERIALS[0]) & ~serial
+    texts = values[rest].astype(str).str.strip()
+    fmt = detect_date_format(texts, cached=cached)
+    if fmt is None: return out.to_numpy(), None
+    parsed = pd.Series(pd.to_datetime(texts, format=fmt, errors='coerce').as_unit('ns'), index=np.flatnonzero(rest))
+    missed = parsed.isna().to_numpy()
+    if missed.any():
+        parsed[missed] = pd.to_datetime(texts[missed], errors='coerce', format='mixed').as_unit('ns')
+    out[rest] = parsed
+    return out.to_numpy(), fmt
+
+def parse_dates(col, cached=None):
+    """A DATE column as datetime64 (unparseable cells become NaT), and the text layout detected for it.
+
+    Only distinct cells are parsed. cached is the layout an earlier version of the same file used; it is tried first.
+    """
+    if pd.api.types.is_datetime64_any_dtype(col): return col.astype('datetime64[ns]').dt.normalize(), None
+    codes, uniques = pd.factorize(col)
+    parsed, fmt = _parse_date_values(uniques, cached=cached)
+    days = pd.Series(np.append(parsed, np.datetime64('NaT', 'ns'))[codes], index=col.index)
+    return days.dt.normalize(), fmt
+
+def _month_name(value):
+    # JANUARY, January, Jan, Sept. or 1 -> JANUARY; anything else is missing
+    text = str(value).strip().upper().rstrip('.')
+    if text.replace('.0', '', 1).isdigit() and 1 <= int(float(text)) <= 12: return MONTHS_ORDER[int(float(text)) - 1]
+    return next((m for m in MONTHS_ORDER if len(text) >= 3 and m.startswith(text)), None)
+
+def normalize_dates(data, date_formats=None):
+    """Parses DATE and derives integer-backed YEAR (Int16) and MONTH (ordered categorical, codes 0-11) keys.
+
+    Given YEAR and MONTH values win; DATE only fills rows where they are missing, or the whole column when a
+    file has none. A DATE cell holding only a year (2024) gives YEAR but no MONTH. MONTH text that names no month (e.g. FEBUARY) and has no DATE to fall back on stays its own
+    category after DECEMBER, so the monthly sheet still lists it. The detected DATE layout is kept in
+    attrs['date_format']; date_formats maps sources (attrs['source']) to layouts detected before.
+    """
+    dates = bare_years = None
+    if 'DATE' in data.columns:
+        if not pd.api.types.is_datetime64_any_dtype(data['DATE']):
+            codes, uniques = pd.factorize(data['DATE'])
+            numbers = _date_numbers(uniques)[1]
+            bare_years = pd.Series(np.append(np.where(_year_only(numbers), numbers, np.nan), np.nan)[codes], index=data.index)
+        cached = (date_formats or {}).get(data.attrs.get('source'))
+        data['DATE'], data.attrs['date_format'] = parse_dates(data['DATE'], cached)
+        dates = data['DATE']
+    if 'YEAR' in data.columns or dates is not None:
+        years = pd.to_numeric(data['YEAR'], errors='coerce') if 'YEAR' in data.columns else pd.Series(np.nan, index=data.index)
+        if dates is not None: years = years.fillna(dates.dt.year)
+        if bare_years is not None: years = years.fillna(bare_years)
+        data['YEAR'] = years.round().astype('Int16')
+    if 'MONTH' in data.columns or dates is not None:
+        months = pd.Series(pd.Categorical([None] * len(data), dtype=MONTH_DTYPE), index=data.index)
+        unmatched = None
+        if 'MONTH' in data.columns:
+            codes, uniques = pd.factorize(data['MONTH'])
+            names = np.array([_month_name(u) for u in uniques] + [None], dtype=object)
+            texts = np.array([None if n is not None or _blank(u) else str(u).strip().upper() for u, n in zip(uniques, names)]
+                             + [None], dtype=object)
+            extra = list(dict.fromkeys(t for t in texts if t is not None))
+            dtype = pd.CategoricalDtype(MONTHS_ORDER + extra, ordered=True) if extra else MONTH_DTYPE
+            months = pd.Series(pd.Categorical(names[codes], dtype=dtype), index=data.index)
+            if extra: unmatched = pd.Series(pd.Categorical(texts[codes], dtype=dtype), index=data.index)
+        if dates is not None:
+            derived = pd.Categorical.from_codes(dates.dt.month.fillna(0).astype(int).to_numpy() - 1, dtype=months.dtype)
+            months = months.fillna(pd.Series(derived, index=data.index))
+        if unmatched is not None: months = months.fillna(unmatched)
+        data['MONTH'] = months
+    return data
+
+def parse_upload(name, payload, all_sheets=False, backend=None):
+    """The schema columns of one uploaded file under their raw headers, each frame with its read_plan.
+
+    Every sheet if all_sheets, else the first one. CSV columns are read with their declared dtypes; workbook
+    columns are projected while parsing and typed by normalize_columns. Each frame's attrs['source'] names
+    the file (and sheet) it came from.
+    """
+    if name.endswith('.csv'):
+        header = _csv_header(payload)
+        names, unknown = read_plan(header)
+        frame = pd.DataFrame() if not names else get_backend(backend).read_csv(
+            payload, usecols=[i for i, h in enumerate(header) if h in names], dtype=schema_dtypes(names))
+        frame.attrs['source'] = name
+        return [(frame, names, unknown)]
+    parsed = []
+    with pd.ExcelFile(io.BytesIO(payload), engine=EXCEL_ENGINE) as book:
+        for sheet in book.sheet_names if all_sheets else book.sheet_names[:1]:
+            headers = []
+            frame = book.parse(sheet, usecols=_column_picker(headers))
+            frame.attrs['source'] = f"{name} [{sheet}]" if all_sheets else name
+            parsed.append((frame, *read_plan(headers)))
+    return parsed
+
+def read_upload(name, payload, all_sheets=False, backend=None, date_formats=None):
+    """Canonical frames of one uploaded file: one per non-empty sheet if all_sheets, else the first sheet."""
+    parsed = parse_upload(name, payload, all_sheets, backend)
+    return [normalize_dates(normalize_columns(f, names), date_formats) for f, names, _ in parsed if not (all_sheets and f.empty)]
+
+def _read_upload_timed(name, payload, all_sheets=False, backend=None, date_formats=None):
+    # Runs in a pool worker: returns the frames, the headers not read, and read and column-mapping (with date
+    # parsing) seconds. Detected layouts travel back in the frames' attrs; the caller caches them
+    start = time.perf_counter()
+    parsed = parse_upload(name, payload, all_sheets, backend)
+    read = time.perf_counter()
+    frames = [normalize_dates(normalize_columns(f, names), date_formats) for f, names, _ in parsed if not (all_sheets and f.empty)]
+    unknown = list(dict.fromkeys(h for _, _, skipped in parsed for h in skipped))
+    return frames, unknown, read - start, time.perf_counter() - read
+
+def process_pool(max_workers=None):
+    """Worker processes for read_uploads, started by forkserver (spawn where that is unavailable), never fork.
+
+    Forking a process that has other threads (the app's job threads, Streamlit's server) can copy a held lock
+    into the child and hang it.
+    """
+    method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context(method))
+
+def read_uploads(uploads, all_sheets=False, max_workers=None, cache=None, digests=None, processes=False, report=None,
+                 backend=None, unknown=None, per_upload=False):
+    """Parses (name, bytes) uploads concurrently; frames come back in upload (then sheet) order.
+
+    With per_upload, the result is one list of frames per upload instead of a single flat list.
+
+    Only RECORD_SCHEMA columns are read; headers outside it are listed per file name in the optional unknown dict.
+    With a cache, files whose content hash was parsed before are reused and only new ones are read.
+    processes=True parses in worker processes, which sidesteps the GIL for openpyxl-bound workbooks; an Executor
+    (such as a long-lived process_pool()) is used as given and left running.
+    CSV files are parsed by the given backend (name); every backend yields the frame pd.read_csv would.
+    """
+    if not uploads: return []
+    if digests is None: digests = [file_digest(payload) for _, payload in uploads]
+    keys = [(digest, name.endswith('.csv'), all_sheets) for (name, _), digest in zip(uploads, digests)]
+    results = [cache.get(k) if cache is not None else None for k in keys]
+    if report is not None:
+        for (name, _), cached in zip(uploads, results):
+            if cached is not None:
+                report.add({'Stage': 'Read file', 'Detail': name, 'Rows': sum(len(f) for f in cached[0]), 'Seconds': 0.0, 'Status': 'cached'})
+    todo = [i for i, cached in enumerate(results) if cached is None]
+    if todo:
+        if isinstance(processes, Executor): executor = nullcontext(processes)
+        elif processes: executor = process_pool(max_workers or min(len(todo), os.cpu_count() or 1))
+        else: executor = ThreadPoolExecutor(max_workers=max_workers or min(len(todo), 16))
+        with executor as pool:
+            names, payloads = [uploads[i][0] for i in todo], [uploads[i][1] for i in todo]
+            known = [date_format_cache.get(name) for name in names]
+            futures = [pool.submit(_read_upload_timed, name, payload, all_sheets, backend, formats)
+                       for name, payload, formats in zip(names, payloads, known)]
+            try:
+                for i, (frames, skipped, read_s, map_s) in zip(todo, (f.result() for f in futures)):
+                    results[i] = (frames, skipped)
+                    if cache is not None: cache.put(keys[i], results[i])
+                    # Workers may be other processes, so the layouts they detected are remembered here
+                    detected = {f.attrs['source']: f.attrs['date_format'] for f in frames if f.attrs.get('date_format')}
+                    if detected: date_format_cache.put(uploads[i][0], {**(date_format_cache.get(uploads[i][0]) or {}), **detected})
+                    if report is None: continue
+                    rows = sum(len(f) for f in frames)
+                    notes = [f"skipped {len(skipped)} unknown column(s)"] if skipped else []
+                    layouts = list(dict.fromkeys(f.attrs['date_format'] for f in frames if f.attrs.get('date_format')))
+                    if layouts: notes.append(f"dates as {', '.join(layouts)}")
+                    mapped = f"{uploads[i][0]}: {'; '.join(notes)}" if notes else uploads[i][0]
+                    report.add({'Stage': 'Read file', 'Detail': uploads[i][0], 'Rows': rows, 'Seconds': round(read_s, 4)})
+                    report.add({'Stage': 'Column mapping', 'Detail': mapped, 'Rows': rows, 'Seconds': round(map_s, 4)})
+                    report.check_cancelled()
+            except Cancelled:
+                # Files not started yet are dropped; only the ones already being parsed are waited for. A shared pool
+                # keeps running for other runs
+                for f in futures: f.cancel()
+                raise
+    if unknown is not None:
+        for (name, _), (_, skipped) in zip(uploads, results):
+            if skipped: unknown[name] = skipped
+    if per_upload: return [frames for frames, _ in results]
+    return [frame for frames, _ in results for frame in frames]
+
+# --- 6. CONSOLIDATION AND EXPORT ---
+def record_labels(frames, positions):
+    """'file row N' for positions in the concatenation of frames; N is the spreadsheet row (headers are row 1)."""
+    ends = np.cumsum([len(f) for f in frames])
+    which = np.searchsorted(ends, positions, side='right')
+    return [f"{frames[w].attrs.get('source', f'file {w + 1}')} row {p - (ends[w] - len(frames[w])) + 2}"
+            for w, p in zip(which, positions)]
+
+def merge_report(found, records, frames, rows=None):
+    """find_duplicates() positions as source rows, with the non-PII fields of the birth that was kept.
+
+    rows maps positions in records to positions in the frames' concatenation when rows were dropped in between.
+    """
+    origin = np.arange(len(records)) if rows is None else rows
+    merged = pd.DataFrame({'Merged record': record_labels(frames, origin[found['Row']]),
+                           'Kept record': record_labels(frames, origin[found['Kept']]),
+                           'Match': found['Match'], 'Similarity': found['Similarity']})
+    for col in ['DATE', 'ADDRESS', 'GENDER']:
+        if col in records.columns: merged[col] = records[col].astype(str).to_numpy()[found['Kept'].to_numpy()]
+    return merged
+
+def consolidate(combined_list, report=None, address_cache=None, fuzzy=None, backend=None, dedupe=True):
+    """Merges parsed frames, resolves addresses, merges repeated births (dedupe), drops PII and builds both
+    summaries (on the given backend)."""
+    engine = get_backend(backend)
+    # AUTO-MERGE
+    with timed_stage(report, "Merge") as stage:
+        full_raw = pd.concat(combined_list, ignore_index=True, sort=False)
+        stage['frame'] = full_raw
+
+    # Clean Address
+    address_stats = {}
+    with timed_stage(report, "Resolve addresses") as stage:
+        if 'ADDRESS' in full_raw.columns:
+            full_raw['ADDRESS'] = resolve_addresses(full_raw, cache=address_cache, fuzzy=fuzzy, stats=address_stats, backend=engine)
+        stage['frame'] = full_raw
+        if 'fuzzy_candidates' in address_stats:
+            address_stats['fuzzy_match_rate'] = address_stats['fuzzy_matched'] / max(address_stats['fuzzy_candidates'], 1)
+            stage['Detail'] = (f"fuzzy matched {address_stats['fuzzy_matched']}/{address_stats['fuzzy_candidates']} "
+                               f"unmatched addresses ({address_stats['fuzzy_match_rate']:.0%}), {address_stats['fuzzy_rows_matched']} rows")
+
+    # One birth reported by several stations is counted once; needs the names, so before they are dropped
+    duplicates = None
+    if dedupe:
+        with timed_stage(report, "Merge duplicates") as stage:
+            found = find_duplicates(full_raw)
+            duplicates = merge_report(found, full_raw, combined_list)
+            full_raw = full_raw.drop(index=found['Row']).reset_index(drop=True)
+            stage['frame'] = full_raw
+            stage['Detail'] = f"merged {(found['Match'] == 'exact').sum()} exact and {(found['Match'] == 'near').sum()} near repeat(s)"
+
+    # Drop PII and compact dtypes without keeping the uncompacted frame alive
+    with timed_stage(report, "Compact records") as stage:
+        full_raw_clean = compact_records(full_raw)
+        del full_raw
+        stage['frame'] = full_raw_clean
+
+    # GENERATE SUMMARIES: one aggregation pass into the cube, both sheets are roll-ups of it
+    cube = None
+    if any(c in full_raw_clean.columns for c in CUBE_DIMENSIONS):
+        with timed_stage(report, "Classify and aggregate") as stage:
+            cube = engine.build_cube(full_raw_clean)
+            stage['Rows'] = len(full_raw_clean)
+            stage['Detail'] = f"{len(cube)} cells on {engine.name}"
+    with timed_stage(report, "Summary", "MONTH"):
+        df_monthly = summary_from_cube(cube, 'MONTH')
+    with timed_stage(report, "Summary", "ADDRESS"):
+        df_annual = summary_from_cube(cube, 'ADDRESS')
+
+    return {'raw': full_raw_clean, 'monthly': df_monthly, 'annual': df_annual, 'cube': cube,
+            'n_files': len(combined_list), 'address_stats': address_stats, 'duplicates': duplicates}
+
+def _excel_value(v):
+    # Same cell values pandas' to_excel writes: blanks for missing, 'inf' for infinities, str() for odd objects
+    if isinstance(v, np.generic): v = v.item()
+    if isinstance(v, float) and math.isinf(v): return 'inf'
+    if isinstance(v, timedelta): return v.total_seconds() / 86400
+    if v is None or isinstance(v, (str, int, float, bool, date)): return v
+    return str(v)
+
+def _excel_values(col):
+    values = col.astype(object).where(col.notna(), None)
+    if pd.api.types.is_integer_dtype(col) or pd.api.types.is_bool_dtype(col): return values.tolist()
+    return [_excel_value(v) for v in values]
+
+def write_sheet(workbook, name, df, header_fmt, chunk_size=10000):
+    """Streams a frame into a new sheet row by row, converting one chunk of rows at a time."""
+    sheet = workbook.add_worksheet(name)
+    sheet.set_column('A:Z', 18)
+    datetime_fmt = workbook.add_format({'num_format': 'YYYY-MM-DD HH:MM:SS'})
+    date_fmt = workbook.add_format({'num_format': 'YYYY-MM-DD'})
+    for col_num, value in enumerate(df.columns):
+        sheet.write(0, col_num, value, header_fmt)
+    for start in range(0, len(df), chunk_size):
+        chunk = df.iloc[start:start + chunk_size]
+        columns = [_excel_values(chunk.iloc[:, i]) for i in range(chunk.shape[1])]
+        date_cols = [i for i, values in enumerate(columns) if any(isinstance(v, date) for v in values)]
+        for row_num, row in enumerate(zip(*columns), start=start + 1):
+            if not date_cols:
+                sheet.write_row(row_num, 0, row)
+                continue
+            # Dated cells need a number format; everything else still goes through one write_row call
+            row = list(row)
+            dated = [(col_num, row[col_num]) for col_num in date_cols]
+            for col_num in date_cols: row[col_num] = None
+            sheet.write_row(row_num, 0, row)
+            for col_num, value in dated:
+                if isinstance(value, date):
+                    sheet.write(row_num, col_num, value, datetime_fmt if isinstance(value, datetime) else date_fmt)
+
+def build_workbook(df_monthly, df_annual, full_raw_clean=None):
+    """Summary sheets plus (optionally) the merged raw data, written in xlsxwriter's constant-memory mode."""
+    output = io.BytesIO()
+    workbook = xlsxwriter.Workbook(output, {'constant_memory': True})
+    header_fmt = workbook.add_format({'bold': True, 'bg_color': '#D7E4BC', 'border': 1})
+    write_sheet(workbook, 'Summary per Month', df_monthly, header_fmt)
+    write_sheet(workbook, 'Annual Summary', df_annual, header_fmt)
+    if full_raw_clean is not None:
+        write_sheet(workbook, 'Merged Raw Data', full_raw_clean, header_fmt)
+    workbook.close()
+    return output.getvalue()
+
+def _arrow_safe(df):
+    # Parquet needs one type per column; mixed-type text columns (e.g. 2600 next to '>2500') become strings
+    df = df.copy(deep=False)
+    for col in df.columns:
+        values = df[col]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            if all(isinstance(c, str) for c in values.cat.categories): continue
+            values = values.astype(object)
+        if values.dtype == object:
+            df[col] = values.astype(str).where(values.notna(), None)
+    return df
+
+RAW_EXPORT_FORMATS = {
+    "Excel sheet": None,
+    "CSV (zip)": ("CHO_Merged_Raw_Data.zip", "application/zip"),
+    "Parquet": ("CHO_Merged_Raw_Data.parquet", "application/octet-stream"),
+}
+
+def export_raw(full_raw_clean, fmt):
+    """Merged raw data as a zipped CSV or a Parquet file, both far quicker to write than an Excel sheet."""
+    output = io.BytesIO()
+    if fmt == "CSV (zip)":
+        with zipfile.ZipFile(output, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+            with zf.open("CHO_Merged_Raw_Data.csv", 'w') as raw_file, io.TextIOWrapper(raw_file, encoding='utf-8', newline='') as text:
+                full_raw_clean.to_csv(text, index=False)
+    elif fmt == "Parquet":
+        _arrow_safe(full_raw_clean).to_parquet(output, index=False)
+    else:
+        raise ValueError(f"Unknown raw export format: {fmt}")
+    return output.getvalue()
+
+# --- 7. CACHING ---
+CACHE_DIR = os.environ.get("CHO_CACHE_DIR", ".cho_cache")
+LOG_PATH = os.environ.get("CHO_LOG_PATH", os.path.join(CACHE_DIR, "pipeline_log.jsonl"))
+
+def log_to_file(path=LOG_PATH):
+    """Appends the stage log (one JSON object per line) to path; safe to call more than once."""
+    path = os.path.abspath(path)
+    if any(getattr(h, 'baseFilename', None) == path for h in log.handlers): return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    handler = logging.FileHandler(path, encoding='utf-8')
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    log.addHandler(handler)
+    log.setLevel(logging.INFO)
+
+def file_digest(payload):
+    return hashlib.sha256(payload).hexdigest()
+
+def approx_bytes(value):
+    """Rough in-memory size of a cached value: frames by memory_usage(deep=True), containers by their items."""
+    if isinstance(value, pd.DataFrame): return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, (pd.Series, pd.Index)): return int(value.memory_usage(deep=True))
+    if isinstance(value, np.ndarray): return value.nbytes
+    if isinstance(value, dict): return sum(approx_bytes(v) for v in value.values())
+    if isinstance(value, (list, tuple)): return sum(approx_bytes(v) for v in value)
+    return sys.getsizeof(value)
+
+class LRUCache:
+    """Thread-safe map that evicts least recently used entries once it holds more than max_entries, or more than
+    max_bytes by approx_bytes(); a value larger than max_bytes on its own is not kept.
+
+    Values are shared, not copied: treat anything read from it as read-only.
+    """
+    def __init__(self, max_entries=None, max_bytes=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()
+        self._sizes = {}
+        self._total = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._items: return None
+            self._items.move_to_end(key)
+            return self._items[key]
+
+    def put(self, key, value):
+        size = approx_bytes(value) if self.max_bytes is not None else 0
+        with self._lock:
+            if key in self._items:
+                del self._items[key]
+                self._total -= self._sizes.pop(key)
+            if self.max_bytes is not None and size > self.max_bytes: return
+            self._items[key], self._sizes[key] = value, size
+            self._total += size
+            while ((self.max_entries is not None and len(self._items) > self.max_entries)
+                   or (self.max_bytes is not None and self._total > self.max_bytes)):
+                oldest, _ = self._items.popitem(last=False)
+                self._total -= self._sizes.pop(oldest)
+
+# Detected DATE layouts per file name (one per sheet source), tried first when a station sends a new version of it
+date_format_cache = LRUCache(max_entries=256)
+
+# --- 8. INCREMENTAL STORE ---
+STORE_DIR = os.environ.get("CHO_STORE_DIR", os.path.join(CACHE_DIR, "store"))
+STORE_FORMAT = 1
+# Per-file parts of the store: subdirectory -> file extension
+STORE_PARTS = {'records': 'parquet', 'cubes': 'parquet', 'hashes': 'npy', 'births': 'npy', 'merged': 'parquet'}
+
+class RecordStore:
+    """Append-mode store: cleaned records and the indicator cube of every ingested file, as Parquet.
+
+    Files are keyed by the SHA-256 of their bytes, so re-uploading a year only processes the files not seen
+    before. With dedupe, a new export of a stored file (same file name) only adds the rows that file did not
+    already have (same raw values, PII included); repeated births are merged within each file (find_duplicates)
+    and exact repeats of a birth stored from an earlier file are dropped through the stored duplicate-key hashes.
+    Near repeats across files are not merged, so totals can be higher than consolidate() gives for the same files.
+    Summaries are rolled up from the sum of the stored per-file cubes rather than from the records. Stored
+    addresses are already resolved, so a change to the reference lists empties the store (re-upload to rebuild it).
+    """
+    def __init__(self, directory=STORE_DIR):
+        self.directory = directory
+        self._lock = threading.Lock()
+        for sub in STORE_PARTS: os.makedirs(os.path.join(directory, sub), exist_ok=True)
+        self.manifest = self._load_manifest()
+        self.invalidated = bool(self.manifest) and (self.manifest.get('reference') != reference_fingerprint()
+                                                    or self.manifest.get('format') != STORE_FORMAT)
+        if self.invalidated or not self.manifest: self.clear()
+
+    def _path(self, *parts):
+        return os.path.join(self.directory, *parts)
+
+    def _load_manifest(self):
+        try:
+            with open(self._path('manifest.json')) as f: return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _save_manifest(self):
+        tmp = self._path('manifest.json.tmp')
+        with open(tmp, 'w') as f: json.dump(self.manifest, f, indent=1)
+        os.replace(tmp, self._path('manifest.json'))
+
+    def clear(self):
+        with self._lock:
+            for sub in STORE_PARTS:
+                for name in os.listdir(self._path(sub)): os.remove(self._path(sub, name))
+            self.manifest = {'reference': reference_fingerprint(), 'format': STORE_FORMAT, 'files': {}}
+            self._save_manifest()
+
+    def digests(self):
+        return list(self.manifest['files'])
+
+    def files(self):
+        return pd.DataFrame([{'File': e['name'], 'Rows': e['rows'], 'Skipped duplicate rows': e['skipped_rows'],
+                              'Merged repeated births': e['merged_births'], 'SHA-256': d[:12]}
+                             for d, e in self.manifest['files'].items()])
+
+    def _options(self, all_sheets, fuzzy, dedupe):
+        return {'all_sheets': all_sheets, 'fuzzy': fuzzy.threshold if fuzzy is not None else None, 'dedupe': dedupe}
+
+    def _stored_hashes(self, sub='hashes', name=None):
+        stored = [np.load(self._path(sub, f"{d}.npy")) for d, e in self.manifest['files'].items()
+                  if name is None or e['name'] == name]
+        return np.concatenate(stored) if stored else np.empty(0, dtype=np.uint64)
+
+    @staticmethod
+    def _merge_births(raw, frames, rows, births):
+        # raw holds rows (positions into frames) of one file; returns it without repeated births, the merge report
+        # and the duplicate-key hashes of the births it keeps. births: hashes already stored, updated in place
+        found = find_duplicates(raw)
+        merged = merge_report(found, raw, frames, rows)
+        raw, rows = raw.drop(index=found['Row']).reset_index(drop=True), np.delete(rows, found['Row'])
+        key = duplicate_key_frame(raw)
+        if key is None: return raw, merged, np.empty(0, dtype=np.uint64)
+        hashes = duplicate_hashes(key)
+        stored = np.isin(hashes, np.fromiter(births, dtype=np.uint64, count=len(births)))
+        repeats = key.index[stored]
+        if len(repeats):
+            earlier = merge_report(_duplicate_frame(repeats, repeats, ['exact'] * len(repeats), [1.0] * len(repeats)), raw, frames, rows)
+            earlier['Kept record'] = "an earlier upload"
+            merged = pd.concat([merged, earlier], ignore_index=True)
+        births.update(hashes[~stored].tolist())
+        return raw.drop(index=repeats).reset_index(drop=True), merged, hashes[~stored]
+
+    def ingest(self, uploads, digests=None, all_sheets=False, address_cache=None, fuzzy=None, report=None, backend=None,
+               dedupe=True, processes=False):
+        """Processes only uploads not stored yet (with these options); returns the names that were added."""
+        engine = get_backend(backend)
+        if digests is None: digests = [file_digest(payload) for _, payload in uploads]
+        options = self._options(all_sheets, fuzzy, dedupe)
+        # The same file uploaded twice is stored once
+        new = list({d: u for u, d in zip(uploads, digests) if self.manifest['files'].get(d, {}).get('options') != options}.items())
+        if report is not None:
+            new_digests = {d for d, _ in new}
+            for (name, _), d in zip(uploads, digests):
+                if d not in new_digests: report.add({'Stage': 'Read file', 'Detail': name, 'Seconds': 0.0, 'Status': 'stored'})
+        if not new: return []
+        with self._lock:
+            unknown = {}
+            with timed_stage(report, "Read files"):
+                parsed = read_uploads([u for _, u in new], all_sheets=all_sheets, digests=[d for d, _ in new], processes=processes,
+                                      report=report, backend=engine.name, unknown=unknown, per_upload=True)
+            for d in [d for d, _ in new]: self._drop(d)
+            births = set(self._stored_hashes('births').tolist())
+            added = []
+            for (digest, (name, _)), frames in zip(new, parsed):
+                with timed_stage(report, "Store file", name) as stage:
+                    raw = pd.concat(frames, ignore_index=True, sort=False) if frames else pd.DataFrame()
+                    # Numbers hash as float64 so 27 and 27.0 (int vs float parse of the same cell) still match
+                    keyed = raw[sorted(raw.columns)]
+                    keyed = keyed.astype({c: 'float64' for c in keyed.columns if pd.api.types.is_numeric_dtype(keyed[c])})
+                    hashes = pd.util.hash_pandas_object(keyed, index=False).to_numpy()
+                    # Only rows a stored export of this same file already had are skipped, and only with dedupe:
+                    # identical rows in different files are counted as consolidate() counts them
+                    fresh = ~np.isin(hashes, self._stored_hashes(name=name)) if dedupe else np.ones(len(raw), dtype=bool)
+                    raw = raw[fresh].reset_index(drop=True)
+                    if 'ADDRESS' in raw.columns or 'SPECIFIC ADDRESS' in raw.columns:
+                        raw['ADDRESS'] = resolve_addresses(raw, cache=address_cache, fuzzy=fuzzy, backend=engine)
+                    merged, kept_births = None, np.empty(0, dtype=np.uint64)
+                    if dedupe: raw, merged, kept_births = self._merge_births(raw, frames, np.flatnonzero(fresh), births)
+                    clean = compact_records(raw)
+                    del raw
+                    cube = engine.build_cube(clean)
+                    dims = list(cube.index.names) if cube is not None else []
+                    if cube is not None: _arrow_safe(cube.reset_index()).to_parquet(self._path('cubes', f"{digest}.parquet"), index=False)
+                    _arrow_safe(clean).to_parquet(self._path('records', f"{digest}.parquet"), index=False)
+                    np.save(self._path('hashes', f"{digest}.npy"), hashes[fresh].astype(np.uint64))
+                    np.save(self._path('births', f"{digest}.npy"), kept_births.astype(np.uint64))
+                    if merged is not None: merged.to_parquet(self._path('merged', f"{digest}.parquet"), index=False)
+                    self.manifest['files'][digest] = {'name': name, 'rows': len(clean), 'skipped_rows': int((~fresh).sum()),
+                                                      'merged_births': len(merged) if merged is not None else 0,
+                                                      'dims': dims, 'options': options, 'unknown_columns': unknown.get(name, [])}
+                    self._save_manifest()
+                    stage['Rows'] = len(clean)
+                    added.append(name)
+            return added
+
+    def _drop(self, digest):
+        entry = self.manifest['files'].pop(digest, None)
+        if entry is None: return
+        for sub, ext in STORE_PARTS.items():
+            path = self._path(sub, f"{digest}.{ext}")
+            if os.path.exists(path): os.remove(path)
+        self._save_manifest()
+
+    def cube(self):
+        """Sum of every stored file's cube, the same cube build_cube gives over all stored records."""
+        cubes = []
+        for d, e in self.manifest['files'].items():
+            if not e['dims']: continue
+            cubes.append(pd.read_parquet(self._path('cubes', f"{d}.parquet")).set_index(e['dims']))
+        return merge_cubes(cubes)
+
+    def records(self):
+        frames = [pd.read_parquet(self._path('records', f"{d}.parquet")) for d in self.manifest['files']]
+        if not frames: return pd.DataFrame()
+        return compact_records(pd.concat(frames, ignore_index=True, sort=False))
+
+    def result(self, report=None):
+        """The consolidate()-shaped result for everything stored."""
+        with timed_stage(report, "Aggregate cube", "stored per-file cubes") as stage:
+            cube = self.cube()
+            stage['Rows'] = sum(e['rows'] for e in self.manifest['files'].values())
+        with timed_stage(report, "Summary", "MONTH"):
+            df_monthly = summary_from_cube(cube, 'MONTH')
+        with timed_stage(report, "Summary", "ADDRESS"):
+            df_annual = summary_from_cube(cube, 'ADDRESS')
+        with timed_stage(report, "Load stored records") as stage:
+            raw = self.records()
+            stage['frame'] = raw
+        unknown = {e['name']: e['unknown_columns'] for e in self.manifest['files'].values() if e['unknown_columns']}
+        merged = [pd.read_parquet(self._path('merged', f"{d}.parquet")) for d, e in self.manifest['files'].items()
+                  if e['options']['dedupe']]
+        duplicates = pd.concat(merged, ignore_index=True) if merged else None
+        return {'raw': raw, 'monthly': df_monthly, 'annual': df_annual, 'cube': cube, 'n_files': len(self.manifest['files']),
+                'address_stats': {}, 'unknown_columns': unknown, 'duplicates': duplicates}
+
+# --- 9. EXECUTION BACKENDS ---
+# The CSV reader, reference matching and indicator cube each run on one backend. Pandas is the default; the DuckDB
+# and Polars engines (optional installs) evaluate the same rules multi-threaded and hand back the pandas objects
+# the pandas code would have produced.
+BACKEND = os.environ.get("CHO_BACKEND", "pandas")
+# Cells pd.read_csv reads as missing by default
+CSV_NA_VALUES = ['', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+                 '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null']
+CSV_TRUE, CSV_FALSE = ['True', 'TRUE', 'true'], ['False', 'FALSE', 'false']
+
+def _csv_column_types(frame, text=()):
+    """Types all-text CSV columns the way pd.read_csv infers them: int, float or bool where every cell parses, else text.
+
+    Columns named in text stay text, as a dtype=str hint leaves them.
+    """
+    typed = {}
+    for name in frame.columns:
+        col = frame[name]
+        present = col.dropna()
+        if name in text:
+            typed[name] = col.astype(STRING_DTYPE)
+        elif present.empty:
+            typed[name] = pd.Series(np.nan, index=frame.index, dtype='float64')
+        elif present.isin(CSV_TRUE + CSV_FALSE).all():
+            flags = col.isin(CSV_TRUE)
+            typed[name] = flags if len(present) == len(col) else flags.astype(object).where(col.notna(), np.nan)
+        else:
+            # A text cell near the top settles most columns without converting all of them
+            head = present.iloc[:1000]
+            numbers = pd.to_numeric(col, errors='coerce') if pd.to_numeric(head, errors='coerce').count() == len(head) else None
+            if numbers is None or numbers.count() < len(present):
+                typed[name] = col.astype(STRING_DTYPE)
+            elif len(present) == len(col) and present.str.fullmatch(r'\s*[+-]?\d+\s*').all():
+                typed[name] = numbers.astype('int64')
+            else:
+                typed[name] = numbers.astype('float64')
+    return pd.DataFrame(typed, index=frame.index)
+
+def _csv_header(payload):
+    return list(pd.read_csv(io.BytesIO(payload), nrows=0).columns)
+
+def _pandas_read_csv(payload, usecols=None, dtype=None):
+    return pd.read_csv(io.BytesIO(payload), usecols=usecols, dtype=dtype)
+
+def _text_values(col):
+    # str(value) of every cell as classify_indicators sees it, missing cells as None; categories convert once each
+    if isinstance(col.dtype, pd.CategoricalDtype):
+        names = np.asarray(col.cat.categories.astype(str), dtype=object)
+        codes = col.cat.codes.to_numpy()
+        return np.where(codes >= 0, names[np.maximum(codes, 0)], None)
+    return col.astype(str).to_numpy(dtype=object, na_value=None)
+
+def _engine_pattern(name):
+    # \bNAME\b without look-around (RE2 and Rust regex have none); [^\pL\pN_] is Python's non-word character
+    return r'(?:^|[^\pL\pN_])' + re.sub(r'([.^$*+?()\[\]{}|\\])', r'\\\1', name) + r'(?:[^\pL\pN_]|$)'
+
+# First matching entry wins: every sitio in list order, then every barangay in list order (as _match_reference)
+REFERENCE_RULES = [(_engine_pattern(s), b) for s, b in SUB_BRGY_MAP.items()] + [(_engine_pattern(b), b) for b in CDO_BARANGAYS]
+
+def _cube_table(df):
+    """Cube dimensions, rule source texts, ages and row order as an Arrow table for the engines.
+
+    None without any dimension, or when a dimension mixes text with other values: the engines could not keep
+    those labels apart the way pandas does, so such frames are cubed by pandas.
+    """
+    import pyarrow as pa
+    dims = [c for c in CUBE_DIMENSIONS if c in df.columns]
+    if not dims: return None
+    columns = {}
+    for i, d in enumerate(dims):
+        col = df[d]
+        if pd.api.types.is_numeric_dtype(col):
+            columns[f'd{i}'] = pa.array(col, from_pandas=True)
+            continue
+        labels = col.cat.categories if isinstance(col.dtype, pd.CategoricalDtype) else col.dropna().unique()
+        if not all(isinstance(v, str) for v in labels): return None
+        columns[f'd{i}'] = pa.array(col.astype(object).to_numpy(dtype=object, na_value=None), type=pa.string())
+    sources = list(dict.fromkeys(col for _, col, _, _ in TEXT_RULES))
+    for i, col in enumerate(sources): columns[f's{i}'] = pa.array(_text_values(df[col]), type=pa.string())
+    columns['age'] = pa.array(pd.to_numeric(df['AGE'], errors='coerce').astype('float64').to_numpy(), from_pandas=True)
+    columns['row'] = pa.array(np.arange(len(df), dtype=np.int64))
+    return pa.table(columns), dims, {col: f's{i}' for i, col in enumerate(sources)}
+
+def _engine_cube(result, dims):
+    # Groups in first-appearance order, as pandas' groupby(sort=False) gives them
+    keys = [f'd{i}' for i in range(len(dims))]
+    result = result.sort_values('first', kind='stable')[keys + INDICATORS].reset_index(drop=True)
+    result = result.rename(columns=dict(zip(keys, dims)))
+    return result.astype({flag: 'int64' for flag in INDICATORS}).set_index(dims)
+
+class PandasBackend:
+    """The reference implementation: eager pandas in this process."""
+    name = 'pandas'
+
+    def read_csv(self, payload, usecols=None, dtype=None):
+        return _pandas_read_csv(payload, usecols, dtype)
+
+    def match_reference(self, full_text):
+        return _match_reference(full_text)
+
+    def build_cube(self, df):
+        return build_cube(df)
+
+class DuckDBBackend:
+    """DuckDB: multi-threaded SQL over Arrow, spilling to CACHE_DIR/duckdb_tmp when a query outgrows memory."""
+    name = 'duckdb'
+
+    def __init__(self):
+        import duckdb
+        self.duckdb = duckdb
+
+    def _connect(self):
+        con = self.duckdb.connect()
+        con.execute(f"SET temp_directory = '{os.path.join(CACHE_DIR, 'duckdb_tmp')}'")
+        return con
+
+    def read_csv(self, payload, usecols=None, dtype=None):
+        import tempfile
+        header = _csv_header(payload)
+        with tempfile.NamedTemporaryFile(suffix='.csv') as f:
+            f.write(payload)
+            f.flush()
+            with self._connect() as con:
+                frame = con.read_csv(f.name, header=True, all_varchar=True, delimiter=',', quotechar='"', escapechar='"',
+                                     na_values=CSV_NA_VALUES).to_arrow_table().to_pandas()
+        # Duplicate or blank headers are renamed differently; leave those files to pandas
+        if list(frame.columns) != header: return _pandas_read_csv(payload, usecols, dtype)
+        if usecols is not None: frame = frame.iloc[:, usecols]
+        return _csv_column_types(frame, text=list(dtype or {}))
+
+    def match_reference(self, full_text):
+        if full_text.empty: return pd.Series(index=full_text.index, dtype=object)
+        import pyarrow as pa
+        table = pa.table({'text': pa.array(full_text.to_numpy(dtype=object, na_value=None), type=pa.string()),
+                          'row': pa.array(np.arange(len(full_text), dtype=np.int64))})
+        cases = ' '.join(f"WHEN regexp_matches(text, '{p}') THEN '{b}'" for p, b in REFERENCE_RULES)
+        with self._connect() as con:
+            con.register('texts', table)
+            matched = con.execute(f"SELECT CASE {cases} END AS barangay FROM texts ORDER BY row").df()['barangay']
+        return pd.Series(matched.to_numpy(dtype=object, na_value=np.nan), index=full_text.index, dtype=object)
+
+    def build_cube(self, df):
+        prepared = _cube_table(df)
+        if prepared is None: return build_cube(df)
+        table, dims, sources = prepared
+        sums = ['COUNT(*) AS total']
+        for flag, col, kind, pattern in TEXT_RULES:
+            test = f"starts_with({sources[col]}, '{pattern}')" if kind == 'prefix' else f"regexp_matches({sources[col]}, '(?i){pattern}')"
+            sums.append(f"SUM(COALESCE({test}, false)::INTEGER) AS {flag}")
+        for flag, low, high in AGE_BANDS:
+            test = f"age >= {low}" + (f" AND age <= {high}" if high is not None else '')
+            sums.append(f"SUM(COALESCE({test}, false)::INTEGER) AS {flag}")
+        keys = ', '.join(f'd{i}' for i in range(len(dims)))
+        with self._connect() as con:
+            con.register('records', table)
+            result = con.execute(f"SELECT {keys}, {', '.join(sums)}, MIN(row) AS first FROM records GROUP BY {keys}").df()
+        return _engine_cube(result, dims)
+
+class PolarsBackend:
+    """Polars: multi-threaded lazy queries, collected on the streaming engine so large inputs run in batches."""
+    name = 'polars'
+
+    def __init__(self):
+        import polars
+        self.pl = polars
+
+    def read_csv(self, payload, usecols=None, dtype=None):
+        pl = self.pl
+        # Polars keeps blank lines as empty rows where pandas skips them; leave those files (and odd headers) to pandas
+        if re.search(rb'\n\r?\n', payload): return _pandas_read_csv(payload, usecols, dtype)
+        if pl.read_csv(io.BytesIO(payload), n_rows=0, infer_schema=False).columns != _csv_header(payload):
+            return _pandas_read_csv(payload, usecols, dtype)
+        frame = pl.read_csv(io.BytesIO(payload), columns=usecols, infer_schema=False, null_values=CSV_NA_VALUES).to_pandas()
+        return _csv_column_types(frame, text=list(dtype or {}))
+
+    def match_reference(self, full_text):
+        pl = self.pl
+        text = pl.col('text')
+        rules = pl.when(text.str.contains(REFERENCE_RULES[0][0])).then(pl.lit(REFERENCE_RULES[0][1]))
+        for pattern, barangay in REFERENCE_RULES[1:]: rules = rules.when(text.str.contains(pattern)).then(pl.lit(barangay))
+        frame = pl.DataFrame({'text': pl.Series(full_text.to_numpy(dtype=object, na_value=None), dtype=pl.String)})
+        matched = frame.select(rules.otherwise(pl.lit(None, dtype=pl.String)).alias('barangay'))['barangay'].to_list()
+        return pd.Series(matched, index=full_text.index, dtype=object).fillna(np.nan)
+
+    def build_cube(self, df):
+        pl = self.pl
+        prepared = _cube_table(df)
+        if prepared is None: return build_cube(df)
+        table, dims, sources = prepared
+        sums = [pl.len().alias('total')]
+        for flag, col, kind, pattern in TEXT_RULES:
+            text = pl.col(sources[col])
+            test = text.str.starts_with(pattern) if kind == 'prefix' else text.str.contains(f'(?i){pattern}')
+            sums.append(test.fill_null(False).cast(pl.Int64).sum().alias(flag))
+        age = pl.col('age')
+        for flag, low, high in AGE_BANDS:
+            test = (age >= low) & (age <= high) if high is not None else age >= low
+            sums.append(test.fill_null(False).cast(pl.Int64).sum().alias(flag))
+        keys = [f'd{i}' for i in range(len(dims))]
+        query = pl.from_arrow(table).lazy().group_by(keys).agg(sums + [pl.col('row').min().alias('first')])
+        return _engine_cube(query.collect(engine='streaming').to_pandas(), dims)
+
+BACKENDS = {'pandas': PandasBackend, 'duckdb': DuckDBBackend, 'polars': PolarsBackend}
+_backends = {}
+
+def available_backends():
+    """Backend names whose engine is installed, pandas first."""
+    return [name for name in BACKENDS if name == 'pandas' or importlib.util.find_spec(name) is not None]
+
+def get_backend(backend=None):
+    """The backend instance for a name (None = CHO_BACKEND, default pandas); instances are passed through."""
+    if backend is None: backend = BACKEND
+    if not isinstance(backend, str): return backend
+    if backend not in BACKENDS: raise ValueError(f"Unknown backend {backend!r}; choose one of {', '.join(BACKENDS)}")
+    if backend not in _backends:
+        try:
+            _backends[backend] = BACKENDS[backend]()
+        except ImportError as e:
+            raise ImportError(f"The {backend} backend needs the '{backend}' package (pip install {backend})") from e
+    return _backends[backend]
+
+# --- 10. PIPELINE RUNS AND BACKGROUND JOBS ---
+def run_pipeline(uploads, report, digests=None, all_sheets=False, fuzzy=None, backend=None, dedupe=True, processes=False,
+                 address_cache=None, file_cache=None, store=None, result_cache=None):
+    """The one read -> consolidate run behind the app, the CLI and the tests: uploads as (name, bytes) pairs in,
+    consolidate()'s result out, plus 'unknown_columns', 'added' (files a store took in) and 'cached'.
+
+    With a RecordStore only uploads it has not stored are processed and the result covers every stored file; a
+    result_cache then serves the previous result while nothing was added.
+    """
+    if store is not None:
+        # Only uploads the store has not seen are processed; summaries come from the stored per-file counts
+        added = store.ingest(uploads, digests, all_sheets=all_sheets, address_cache=address_cache, fuzzy=fuzzy, report=report,
+                             backend=backend, dedupe=dedupe, processes=processes)
+        result_key = ('store', tuple(store.digests()))
+        # Files re-processed under other options (e.g. dedupe) keep their digests, so only reuse when nothing was added
+        result = result_cache.get(result_key) if result_cache is not None and not added else None
+        if result is not None:
+            result.update(added=added, cached=True)
+            return result
+        result = store.result(report)
+        if result_cache is not None: result_cache.put(result_key, result)
+    else:
+        added, unknown = [], {}
+        with report.stage("Read files"):
+            combined_list = read_uploads(uploads, all_sheets=all_sheets, cache=file_cache, digests=digests, processes=processes,
+                                         report=report, backend=backend, unknown=unknown)
+        result = consolidate(combined_list, report, address_cache=address_cache, fuzzy=fuzzy, backend=backend, dedupe=dedupe)
+        result['unknown_columns'] = unknown
+    result.update(added=added, cached=False)
+    return result
+
+class BackgroundJob:
+    """One pipeline run, fn(report), on a shared executor so the caller (the Streamlit script) never blocks on it.
+
+    progress() estimates completion from the stage entries logged so far against planned_steps; cancel() stops
+    the run at its next stage or file boundary (or before it starts, if it is still queued).
+    """
+    def __init__(self, fn, executor, planned_steps, track_memory=False):
+        self.report = StageReport(track_memory=track_memory)
+        self.planned_steps = max(planned_steps, 1)
+        self._started = threading.Event()
+        self.future = executor.submit(self._run, fn)
+
+    def _run(self, fn):
+        self._started.set()
+        try:
+            return fn(self.report)
+        finally:
+            self.report.close()
+
+    @property
+    def done(self):
+        return self.future.done()
+
+    @property
+    def cancelled(self):
+        return self.report.cancelled
+
+    def cancel(self):
+        self.report.cancel()
+        self.future.cancel()
+
+    def progress(self):
+        """(fraction done, what is running now)."""
+        if self.future.done(): return 1.0, "Finished"
+        if not self._started.is_set(): return 0.0, "Queued behind other runs"
+        return min(len(self.report.rows) / self.planned_steps, 0.99), self.report.current or "Starting"
+
+    def result(self):
+        """The run's return value; raises what the run raised, or Cancelled."""
+        if self.future.cancelled(): raise Cancelled("Cancelled before it started")
+        return self.future.result()
+
+def planned_steps(n_files, append=False, dedupe=True):
+    # Entries a run adds to its report: per file a read and a column mapping (plus storing, in append mode),
+    # then the merge-to-summary stages
+    return n_files * (3 if append else 2) + (5 if append else 7 + dedupe)
+
+# --- 11. BATCH JOBS AND CLI ---
+INPUT_EXTENSIONS = ('.csv', '.xls', '.xlsx', '.xlsm')
+RAW_FORMAT_CHOICES = {'excel': "Excel sheet", 'csv-zip': "CSV (zip)", 'parquet': "Parquet"}
+
+def expand_inputs(patterns):
+    """Files, globs or directories (every station file directly inside) -> sorted, de-duplicated file paths."""
+    paths = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = [os.path.join(pattern, n) for n in os.listdir(pattern) if n.lower().endswith(INPUT_EXTENSIONS)]
+        else:
+            matches = glob.glob(pattern) or ([pattern] if os.path.exists(pattern) else [])
+        if not matches: raise FileNotFoundError(f"No input files match: {pattern}")
+        paths.extend(sorted(m for m in matches if os.path.isfile(m)))
+    return list(dict.fromkeys(paths))
+
+def load_uploads(paths):
+    uploads = []
+    for path in paths:
+        with open(path, 'rb') as f: uploads.append((os.path.basename(path), f.read()))
+    return uploads
+
+def run_job(inputs, output, all_sheets=False, raw_format="Excel sheet", cache_path=None, processes=False, log_path=None,
+            fuzzy_threshold=None, store_dir=None, backend=None, dedupe=True):
+    """Consolidates one set of station files into the same workbook the app offers for download."""
+    if log_path: log_to_file(log_path)
+    uploads = load_uploads(expand_inputs(inputs))
+    address_cache = AddressCache(cache_path) if cache_path else None
+    report = StageReport(run_id=os.path.splitext(os.path.basename(output))[0])
+    fuzzy = FuzzyMatcher(fuzzy_threshold) if fuzzy_threshold else None
+    result = run_pipeline(uploads, report, all_sheets=all_sheets, fuzzy=fuzzy, backend=backend, dedupe=dedupe, processes=processes,
+                          address_cache=address_cache, store=RecordStore(store_dir) if store_dir else None)
+    raw_in_workbook = RAW_EXPORT_FORMATS[raw_format] is None
+    if os.path.dirname(output): os.makedirs(os.path.dirname(output), exist_ok=True)
+    with report.stage("Workbook build") as stage, open(output, 'wb') as f:
+        f.write(build_workbook(result['monthly'], result['annual'], result['raw'] if raw_in_workbook else None))
+        stage['Rows'] = len(result['raw'])
+    written = [output]
+    if not raw_in_workbook:
+        raw_path = os.path.splitext(output)[0] + "_raw" + os.path.splitext(RAW_EXPORT_FORMATS[raw_format][0])[1]
+        with open(raw_path, 'wb') as f: f.write(export_raw(result['raw'], raw_format))
+        written.append(raw_path)
+    # With a store, rows and frames are the store's totals (every file stored so far), not this run's inputs
+    return {'files': len(uploads), 'frames': result['n_files'], 'rows': len(result['raw']), 'written': written,
+            'address_stats': result['address_stats'], 'unknown_columns': result['unknown_columns'],
+            'merged_births': len(result['duplicates']) if result['duplicates'] is not None else None,
+            'stored': {'files': result['n_files'], 'added': len(result['added'])} if store_dir else None}
+
+def describe_job(summary):
+    stored = summary.get('stored')
+    if stored:
+        text = (f"{summary['rows']} records in the store from {stored['files']} stored file(s); "
+                f"{stored['added']} of {summary['files']} input file(s) added -> {', '.join(summary['written'])}")
+    else:
+        text = f"{summary['rows']} records from {summary['files']} file(s) -> {', '.join(summary['written'])}"
+    stats = summary.get('address_stats', {})
+    if 'fuzzy_candidates' in stats:
+        text += f" (fuzzy matched {stats['fuzzy_matched']}/{stats['fuzzy_candidates']} unmatched addresses, {stats['fuzzy_rows_matched']} rows)"
+    if summary.get('merged_births'): text += f"\n  merged {summary['merged_births']} repeated birth record(s)"
+    for name, headers in summary.get('unknown_columns', {}).items():
+        text += f"\n  {name}: skipped unknown column(s) {', '.join(headers)}"
+    return text
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Consolidate CHO station submissions into the summary workbook.")
+    parser.add_argument('inputs', nargs='+', help="input files, globs or directories")
+    parser.add_argument('-o', '--output', default="CHO_Consolidated_Health_Records.xlsx", help="workbook to write (single job)")
+    parser.add_argument('--per-directory', action='store_true',
+                        help="treat each input directory (e.g. one per year) as its own job, written to --out-dir/<name>.xlsx")
+    parser.add_argument('--out-dir', default='.', help="output directory for --per-directory jobs")
+    parser.add_argument('--all-sheets', action='store_true', help="read every sheet of each workbook")
+    parser.add_argument('--raw-format', choices=list(RAW_FORMAT_CHOICES), default='excel',
+                        help="where the merged raw data goes: a workbook sheet, a zipped CSV or a Parquet file")
+    parser.add_argument('-j', '--jobs', type=int, default=None, help="parallel worker processes (default: CPU count)")
+    parser.add_argument('--cache-dir', default=CACHE_DIR, help="address cache directory (CHO_CACHE_DIR)")
+    parser.add_argument('--no-address-cache', action='store_true', help="resolve every address without the on-disk cache")
+    parser.add_argument('--fuzzy', type=float, metavar='THRESHOLD', default=None,
+                        help="also fuzzy-match misspelled barangays at this similarity (0-1, e.g. 0.85)")
+    parser.add_argument('--backend', choices=list(BACKENDS), default=BACKEND,
+                        help="engine for CSV parsing, address matching and indicator counts (CHO_BACKEND); "
+                             "duckdb and polars need those packages installed and give identical output")
+    parser.add_argument('--keep-duplicates', action='store_true',
+                        help="count every record, even births reported by more than one station (same mother, date, "
+                             "barangay and sex); by default repeats are merged")
+    parser.add_argument('--append', action='store_true',
+                        help="add the inputs to the incremental record store (only unseen files/rows are processed) "
+                             "and report over everything stored")
+    parser.add_argument('--store-dir', default=STORE_DIR, help="record store for --append (CHO_STORE_DIR)")
+    parser.add_argument('--log-file', default=None, help="append per-stage timings as JSON lines (default: CHO_LOG_PATH)")
+    args = parser.parse_args(argv)
+
+    cache_path = None if args.no_address_cache else os.path.join(args.cache_dir, "address_cache.sqlite")
+    if cache_path: AddressCache(cache_path)  # create/refresh once before workers share it
+    options = dict(all_sheets=args.all_sheets, raw_format=RAW_FORMAT_CHOICES[args.raw_format], cache_path=cache_path,
+                   log_path=args.log_file or LOG_PATH, fuzzy_threshold=args.fuzzy, backend=args.backend,
+                   dedupe=not args.keep_duplicates)
+    if args.append and args.per_directory: parser.error("--append works on one store; run it without --per-directory")
+    try:
+        get_backend(args.backend)
+    except ImportError as e:
+        parser.error(str(e))
+    if args.append: options['store_dir'] = args.store_dir
+    log_to_file(options['log_path'])
+
+    if not args.per_directory:
+        try:
+            summary = run_job(args.inputs, args.output, processes=True, **options)
+        except Exception as e:
+            print(f"Processing Error: {e}", file=sys.stderr)
+            return 1
+        print(describe_job(summary))
+        return 0
+
+    jobs = {}
+    for directory in args.inputs:
+        if not os.path.isdir(directory): parser.error(f"--per-directory expects directories, got: {directory}")
+        name = os.path.basename(os.path.normpath(directory))
+        jobs[directory] = os.path.join(args.out_dir, f"{name}.xlsx")
+    failed = 0
+    with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        futures = {d: pool.submit(run_job, [d], out, **options) for d, out in jobs.items()}
+        for directory, future in futures.items():
+            try:
+                summary = future.result()
+                print(f"{directory}: {describe_job(summary)}")
+            except Exception as e:
+                failed += 1
+                print(f"{directory}: Processing Error: {e}", file=sys.stderr)
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
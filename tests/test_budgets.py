@@ -0,0 +1,77 @@
+"""Per-stage time and memory budgets for a full run (read, consolidate, workbook with raw data) at fixed sizes.
+
+Station files are synthetic (benchmarks/bench_pipeline.py, fixed seed) and split four ways like real uploads.
+Seconds come from an untraced run and peak allocations (tracemalloc) from a second, traced one, since tracing
+slows every stage down. Budgets leave headroom over this repository's reference runs; a stage going over means
+a throughput or memory regression. CHO_BUDGET_SCALE multiplies the time budgets on slower machines.
+"""
+import os
+
+import numpy as np
+import pytest
+
+import cho_pipeline as cho
+from bench_pipeline import generate_records
+
+TIME_SCALE = float(os.environ.get("CHO_BUDGET_SCALE", "1"))
+# rows -> stage -> (seconds, peak MB)
+BUDGETS = {
+    20_000: {
+        "Read files": (1.0, 16), "Merge": (0.5, 8), "Resolve addresses": (0.5, 16), "Merge duplicates": (1.0, 32),
+        "Compact records": (0.5, 8), "Classify and aggregate": (0.5, 16), "Summary": (0.5, 4), "Workbook build": (6.0, 16),
+    },
+    100_000: {
+        "Read files": (2.0, 32), "Merge": (0.5, 16), "Resolve addresses": (1.0, 32), "Merge duplicates": (2.0, 128),
+        "Compact records": (0.5, 16), "Classify and aggregate": (1.0, 48), "Summary": (0.5, 4), "Workbook build": (20.0, 16),
+    },
+}
+
+
+def stage_costs(uploads, track_memory):
+    # Seconds summed and peak MB maxed per stage; per-file entries overlap inside "Read files" and are left out
+    report = cho.StageReport(track_memory=track_memory)
+    result = cho.run_pipeline(uploads, report)
+    with report.stage("Workbook build"):
+        cho.build_workbook(result["monthly"], result["annual"], result["raw"])
+    stages = report.close()
+    stages = stages[~stages["Stage"].isin(["Read file", "Column mapping"])]
+    costs = {"Seconds": "sum", "Peak (MB)": "max"} if track_memory else {"Seconds": "sum"}
+    return stages.groupby("Stage", sort=False).agg(costs)
+
+
+@pytest.fixture(scope="module", params=sorted(BUDGETS))
+def sized_run(request):
+    rows = request.param
+    records = generate_records(rows, seed=0)
+    uploads = [(f"station_{i + 1}.csv", records.iloc[part].to_csv(index=False).encode())
+               for i, part in enumerate(np.array_split(np.arange(rows), 4))]
+    return rows, stage_costs(uploads, False), stage_costs(uploads, True)
+
+
+def test_every_stage_has_a_budget(sized_run):
+    rows, timed, _ = sized_run
+    assert set(timed.index) == set(BUDGETS[rows]), "add a budget for new stages (and drop removed ones)"
+
+
+def test_stage_time_budgets(sized_run):
+    rows, timed, _ = sized_run
+    over = {stage: round(seconds, 3) for stage, seconds in timed["Seconds"].items()
+            if seconds > BUDGETS[rows].get(stage, (np.inf,))[0] * TIME_SCALE}
+    assert not over, f"{rows} rows: stages over their time budget (seconds): {over}"
+
+
+def test_stage_memory_budgets(sized_run):
+    rows, _, traced = sized_run
+    over = {stage: peak for stage, peak in traced["Peak (MB)"].items() if peak > BUDGETS[rows].get(stage, (0, np.inf))[1]}
+    assert not over, f"{rows} rows: stages over their memory budget (peak MB): {over}"
+
+
+def test_cache_is_bounded_by_size():
+    frame = generate_records(2_000, seed=1)
+    size = cho.approx_bytes(frame)
+    cache = cho.LRUCache(max_bytes=int(size * 2.5))
+    for key in "abc": cache.put(key, frame)
+    # Two frames fit; the least recently used one goes, and a value over the whole budget is never kept
+    assert cache.get("a") is None and cache.get("b") is not None and cache.get("c") is not None
+    cache.put("big", [frame] * 3)
+    assert cache.get("big") is None and cache.get("c") is not None
@@ -0,0 +1,38 @@
+"""DATE parsing: every layout stations send becomes the right calendar day, and YEAR/MONTH follow from it."""
+from datetime import date
+
+import pandas as pd
+
+import cho_pipeline as cho
+
+
+def test_layouts_and_excel_serials():
+    data = cho.normalize_dates(pd.DataFrame({"DATE": ["03/14/2024", 45400, "45400", "20240305", date(2024, 1, 2)]}))
+    assert data["DATE"].dt.strftime("%Y-%m-%d").tolist() == ["2024-03-14", "2024-04-18", "2024-04-18", "2024-03-05", "2024-01-02"]
+    assert data["MONTH"].astype(str).tolist() == ["MARCH", "APRIL", "APRIL", "MARCH", "JANUARY"]
+
+
+def test_bare_year_is_a_year_not_a_serial_date():
+    data = cho.normalize_dates(pd.DataFrame({"DATE": [2024, 2023, "2024-05-01"]}))
+    assert data["YEAR"].tolist() == [2024, 2023, 2024]
+    assert data["DATE"].isna().tolist() == [True, True, False]
+    assert data["MONTH"].isna().tolist() == [True, True, False]
+
+
+def test_small_numbers_are_no_date():
+    data = cho.normalize_dates(pd.DataFrame({"DATE": [5, 1000, "12"]}))
+    assert data["DATE"].isna().all() and data["YEAR"].isna().all()
+
+
+def test_unrecognised_month_text_is_kept_after_the_months():
+    data = cho.normalize_dates(pd.DataFrame({"MONTH": ["FEBUARY", "jan 2024", "Sept."], "DATE": [None, None, None]}))
+    assert data["MONTH"].astype(str).tolist() == ["FEBUARY", "JAN 2024", "SEPTEMBER"]
+    assert list(data["MONTH"].cat.categories[12:]) == ["FEBUARY", "JAN 2024"]
+
+
+def test_layout_detected_in_a_worker_process_is_remembered():
+    first = b"Mother's Name,Date of Birth\nA,05/03/2024\nB,13/03/2024\n"
+    cho.read_uploads([("layout.csv", first)], processes=True)
+    # A later version with only ambiguous dates is read the way the station wrote the first one
+    frame, = cho.read_uploads([("layout.csv", b"Mother's Name,Date of Birth\nC,04/03/2024\n")], processes=True)
+    assert frame["DATE"].tolist() == [pd.Timestamp("2024-03-04")]
@@ -0,0 +1,52 @@
+"""Repeated-birth detection: one birth reported by several stations is merged, distinct births never are."""
+import pandas as pd
+
+import cho_pipeline as cho
+
+
+def births(*rows, **shared):
+    # One record per (child, mother) pair; every other field is shared unless given
+    fields = {"DATE": "2024-03-05", "ADDRESS": "CARMEN", "GENDER": "M", **shared}
+    return pd.DataFrame([{"NAME": child, "MOTHER_NAME": mother, **fields} for child, mother in rows])
+
+
+def test_same_birth_reported_twice_is_merged():
+    found = cho.find_duplicates(births(("JUAN A", "MARIA DELA CRUZ"), ("JUAN A", "DELA CRUZ, MARIA")))
+    assert found[["Row", "Kept", "Match"]].values.tolist() == [[1, 0, "exact"]]
+
+
+def test_misspelled_mother_is_a_near_repeat():
+    found = cho.find_duplicates(births(("JUAN A", "MARIA DELA CRUZ"), ("JUAN A", "MARIA DELA CRUS")))
+    assert found[["Row", "Kept", "Match"]].values.tolist() == [[1, 0, "near"]]
+
+
+def test_blank_child_name_still_merges():
+    found = cho.find_duplicates(births(("JUAN A", "MARIA DELA CRUZ"), (None, "MARIA DELA CRUZ")))
+    assert found[["Row", "Kept"]].values.tolist() == [[1, 0]]
+
+
+def test_twins_stay_two_records():
+    found = cho.find_duplicates(births(("JUAN A", "MARIA DELA CRUZ"), ("JOSE A", "MARIA DELA CRUZ")))
+    assert found.empty
+
+
+def test_mothers_differing_in_a_digit_stay_apart():
+    assert cho.find_duplicates(births((None, "MOTHER 770"), (None, "MOTHER 370"))).empty
+    assert cho.find_duplicates(births(("CHILD 584", "MOTHER 584"), ("CHILD 583", "MOTHER 583"))).empty
+
+
+def test_transient_and_missing_addresses_have_no_near_repeats():
+    for address in ["TRANSIENT", "MISSING"]:
+        found = cho.find_duplicates(births(("JUAN A", "MARIA DELA CRUZ"), ("JUAN A", "MARIA DELA CRUS"), ADDRESS=address))
+        assert found.empty
+    # An exact repeat is still the same birth wherever the mother lives
+    found = cho.find_duplicates(births(("JUAN A", "MARIA DELA CRUZ"), ("JUAN A", "MARIA DELA CRUZ"), ADDRESS="TRANSIENT"))
+    assert len(found) == 1
+
+
+def test_large_block_is_searched_by_name_neighbourhood():
+    # 20k births on one day in one barangay: one block, which a pairwise search could not get through
+    mothers = [(None, f"MOTHER {i}") for i in range(20_000)]
+    df = births(*mothers[:7_000], ("JUAN A", "MARIA DELA CRUZ"), *mothers[7_000:], ("JUAN A", "MARIA DELA CRUS"))
+    found = cho.find_duplicates(df)
+    assert found[["Row", "Kept", "Match"]].values.tolist() == [[20_001, 7_000, "near"]]
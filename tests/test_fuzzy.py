@@ -0,0 +1,12 @@
+"""Typo-tolerant barangay lookup: a misspelling is matched up to the threshold, and no further."""
+import cho_pipeline as cho
+
+
+def test_score_equal_to_threshold_matches():
+    # One edit in ten letters scores exactly 0.90
+    assert cho.FuzzyMatcher(0.90).match("MACASANDIK") == "MACASANDIG"
+    assert cho.FuzzyMatcher(0.95).match("MACASANDIK") is None
+
+
+def test_digits_must_match():
+    assert cho.FuzzyMatcher(0.80).match("BARANGAY 41") != "BARANGAY 4"
@@ -0,0 +1,88 @@
+"""Golden-output regression: the figures the summary sheets report for the frozen station files in tests/fixtures.
+
+Counts and percentages must equal the tables in tests/golden exactly, for every backend and after the workbook
+round trip. The fixtures were cut from benchmarks/bench_pipeline.py records (three stations, one of them
+re-reporting births the others sent) plus edge_cases.csv; they are data now, never regenerated. After an
+intended change to the figures, review the diff and rewrite the tables:
+
+    python -m pytest tests/test_golden.py --update-golden
+"""
+import glob
+import io
+import os
+
+import pandas as pd
+import pytest
+
+import cho_pipeline as cho
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+FIXTURE_DIR = os.path.join(HERE, "fixtures")
+GOLDEN_DIR = os.path.join(HERE, "golden")
+# consolidate() options with their own golden tables
+VARIANTS = {"default": {}, "fuzzy": {"fuzzy": 0.85}, "keep_duplicates": {"dedupe": False}}
+SHEETS = {"monthly": "Summary per Month", "annual": "Annual Summary"}
+
+
+def consolidated(uploads, variant, backend=None):
+    options = dict(VARIANTS[variant])
+    if "fuzzy" in options: options["fuzzy"] = cho.FuzzyMatcher(options["fuzzy"])
+    return cho.run_pipeline(uploads, cho.StageReport(), backend=backend, **options)
+
+
+def check_golden(table, name, update, rtol=None):
+    # rtol only for tables read back from a workbook: Excel keeps 15 significant digits of a percentage
+    path = os.path.join(GOLDEN_DIR, f"{name}.csv")
+    if update:
+        os.makedirs(GOLDEN_DIR, exist_ok=True)
+        table.to_csv(path, index=False)
+        return
+    expected = pd.read_csv(path, dtype={table.columns[0]: str}, keep_default_na=False, na_values=[""], float_precision="round_trip")
+    if rtol is None: pd.testing.assert_frame_equal(table.reset_index(drop=True), expected, check_dtype=False, check_exact=True)
+    else: pd.testing.assert_frame_equal(table.reset_index(drop=True), expected, check_dtype=False, rtol=rtol)
+
+
+@pytest.fixture(scope="module")
+def uploads():
+    return cho.load_uploads(sorted(glob.glob(os.path.join(FIXTURE_DIR, "*"))))
+
+
+@pytest.fixture(scope="module")
+def results(uploads):
+    return {variant: consolidated(uploads, variant) for variant in VARIANTS}
+
+
+@pytest.mark.parametrize("sheet", SHEETS)
+@pytest.mark.parametrize("variant", VARIANTS)
+def test_summary_matches_golden(results, variant, sheet, update_golden):
+    check_golden(results[variant][sheet], f"{variant}_{sheet}", update_golden)
+
+
+@pytest.mark.parametrize("backend", ["duckdb", "polars"])
+def test_backend_matches_golden(uploads, backend, update_golden):
+    pytest.importorskip(backend)
+    if update_golden: pytest.skip("golden tables are written from the pandas backend")
+    result = consolidated(uploads, "default", backend)
+    for sheet in SHEETS: check_golden(result[sheet], f"default_{sheet}", False)
+
+
+def test_workbook_matches_golden(results, update_golden):
+    if update_golden: pytest.skip("golden tables are written from the summaries themselves")
+    result = results["default"]
+    book = pd.read_excel(io.BytesIO(cho.build_workbook(result["monthly"], result["annual"], result["raw"])), sheet_name=None)
+    for sheet, name in SHEETS.items():
+        counts = [c for c in book[name].columns[1:] if not c.startswith("%")]
+        assert (book[name][counts].to_numpy() == result[sheet][counts].to_numpy()).all()
+        check_golden(book[name], f"default_{sheet}", False, rtol=1e-14)
+    assert len(book["Merged Raw Data"]) == len(result["raw"])
+
+
+def test_every_record_is_counted_once(results):
+    # Rows without a barangay or month fall out of that sheet only; the rest add up to the merged records
+    for result in results.values():
+        raw = result["raw"]
+        assert result["annual"]["Total Count"].sum() == raw["ADDRESS"].notna().sum()
+        assert result["monthly"]["Total Count"].sum() == raw["MONTH"].notna().sum()
+    merged = results["default"]["duplicates"]
+    assert len(results["keep_duplicates"]["raw"]) - len(results["default"]["raw"]) == len(merged)
+    assert set(merged["Match"]) == {"exact", "near"}
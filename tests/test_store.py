@@ -0,0 +1,37 @@
+"""Append mode: the record store must count the fixture stations the way one consolidate() over them does."""
+import glob
+import os
+
+import cho_pipeline as cho
+
+FIXTURES = sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "*")))
+
+
+def test_store_without_dedupe_matches_consolidate(tmp_path):
+    uploads = cho.load_uploads(FIXTURES)
+    store = cho.RecordStore(str(tmp_path))
+    store.ingest(uploads, dedupe=False)
+    expected = cho.consolidate(cho.read_uploads(uploads), dedupe=False)
+    assert store.result()["annual"]["Total Count"].sum() == expected["annual"]["Total Count"].sum() == len(expected["raw"])
+
+
+def test_reexport_of_a_stored_file_adds_only_new_rows(tmp_path):
+    uploads = cho.load_uploads(FIXTURES)
+    name, payload = next(u for u in uploads if u[0].endswith(".csv"))
+    store = cho.RecordStore(str(tmp_path))
+    store.ingest(uploads)
+    before = len(store.records())
+    lines = payload.decode().splitlines(keepends=True)
+    # One more month of records appended to the same station export
+    extra = [line.replace("CHILD", "CHILD NEW") for line in lines[1:4]]
+    store.ingest([(name, "".join(lines + extra).encode())])
+    assert len(store.records()) == before + len(extra)
+    assert store.files()["Skipped duplicate rows"].iloc[-1] == len(lines) - 1
+
+
+def test_append_job_reports_store_totals_apart_from_inputs(tmp_path):
+    first, second = FIXTURES[:2]
+    cho.run_job([first], str(tmp_path / "first.xlsx"), store_dir=str(tmp_path / "store"))
+    summary = cho.run_job([second], str(tmp_path / "second.xlsx"), store_dir=str(tmp_path / "store"))
+    assert summary["stored"] == {"files": 2, "added": 1}
+    assert cho.describe_job(summary).startswith(f"{summary['rows']} records in the store from 2 stored file(s); 1 of 1 input")